@@ -0,0 +1,106 @@
+import time
+import zlib
+from dataclasses import dataclass
+
+from diskcache import Cache
+
+
+@dataclass
+class CachedArticle:
+    body: str
+    etag: str | None = None
+    last_modified: str | None = None
+    stored_at: float = 0.0
+
+
+class ArticleCache:
+    """Cleaned article bodies on disk, keyed by url, evicted by size and age."""
+
+    def __init__(
+        self,
+        directory: str = ".cache/articles",
+        size_limit: int = 256 * 2**20,
+        max_age: float = 7 * 24 * 3600,
+        fresh_for: float = 15 * 60,
+    ) -> None:
+        self.max_age = max_age
+        self.fresh_for = fresh_for
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._cache = Cache(
+            directory,
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+        )
+
+    def get(self, url) -> CachedArticle | None:
+        entry = self._cache.get(url)
+        if entry is None:
+            return None
+        return CachedArticle(
+            body=zlib.decompress(entry["body"]).decode(),
+            etag=entry["etag"],
+            last_modified=entry["last_modified"],
+            stored_at=entry["stored_at"],
+        )
+
+    def is_fresh(self, article: CachedArticle):
+        return time.time() - article.stored_at < self.fresh_for
+
+    def validators(self, article: CachedArticle | None):
+        headers = {}
+        if article is None:
+            return headers
+        if article.etag:
+            headers["If-None-Match"] = article.etag
+        if article.last_modified:
+            headers["If-Modified-Since"] = article.last_modified
+        return headers
+
+    def hit(self, url, article: CachedArticle, revalidated=False):
+        self.hits += 1
+        if revalidated:
+            self.revalidations += 1
+            article.stored_at = time.time()
+            self._put(url, article)
+        return article.body
+
+    def store(self, url, body, headers: dict[str, str], cacheable=True):
+        self.misses += 1
+        if not cacheable:
+            return body
+        article = CachedArticle(
+            body=body,
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            stored_at=time.time(),
+        )
+        self._put(url, article)
+        return body
+
+    def _put(self, url, article: CachedArticle):
+        self._cache.set(
+            url,
+            {
+                "body": zlib.compress(article.body.encode()),
+                "etag": article.etag,
+                "last_modified": article.last_modified,
+                "stored_at": article.stored_at,
+            },
+            expire=self.max_age,
+        )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._cache),
+            "size_bytes": self._cache.volume(),
+        }
+
+    def close(self):
+        self._cache.close()
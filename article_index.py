@@ -0,0 +1,391 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from news_filters import NewsFilter
+from news_loader import NewsLoader
+from similarity import StoryClusters
+
+# sqlite file for the local article index, unset answers the feed live
+NEWS_INDEX = os.getenv("NEWS_INDEX", "")
+NEWS_INGEST_INTERVAL = float(os.getenv("NEWS_INGEST_INTERVAL", 60))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    uuid TEXT PRIMARY KEY,
+    published_at TEXT NOT NULL,
+    locale TEXT,
+    language TEXT,
+    top INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_published ON articles (published_at);
+CREATE INDEX IF NOT EXISTS articles_top ON articles (top, published_at);
+CREATE INDEX IF NOT EXISTS articles_locale ON articles (locale, published_at);
+CREATE INDEX IF NOT EXISTS articles_language ON articles (language, published_at);
+CREATE TABLE IF NOT EXISTS article_categories (
+    category TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    PRIMARY KEY (category, uuid)
+) WITHOUT ROWID;
+-- rows share the rowid of their article
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_text USING fts5(
+    title, description, snippet, keywords
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    kind TEXT PRIMARY KEY,
+    published_at TEXT NOT NULL
+);
+-- ranges below the watermark a poll ran out of pages for
+CREATE TABLE IF NOT EXISTS ingest_gaps (
+    kind TEXT NOT NULL,
+    published_after TEXT NOT NULL,
+    published_before TEXT NOT NULL,
+    PRIMARY KEY (kind, published_before)
+);
+"""
+
+
+def _timestamp(value):
+    # TheNewsAPI sends "2024-10-30T12:00:00.000000Z", filters are naive datetimes
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S")
+    return value[:19]
+
+
+def _match(search):
+    # every word must appear; quoted so user input can't use fts5 syntax
+    words = search.split()
+    return " ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+class ArticleIndex:
+    """TheNewsAPI articles in a local sqlite database, queried by NewsFilter.
+
+    Pages come back newest first, `page_size` articles each like TheNewsAPI's
+    own pages, with the same shape as its responses.
+    """
+
+    def __init__(self, path: str = ".cache/news.db", page_size: int = 3) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.page_size = page_size
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def upsert(self, articles: list[dict], top=False):
+        """Store articles, returns how many were new."""
+        new = 0
+        with self._db:
+            for article in articles:
+                uuid = article["uuid"]
+                known = self._db.execute(
+                    "SELECT rowid FROM articles WHERE uuid = ?", (uuid,)
+                ).fetchone()
+                # updated in place, an article seen among top stories stays one
+                (rowid,) = self._db.execute(
+                    "INSERT INTO articles"
+                    " (uuid, published_at, locale, language, top, data)"
+                    " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (uuid) DO UPDATE SET"
+                    " published_at = excluded.published_at,"
+                    " locale = excluded.locale, language = excluded.language,"
+                    " top = max(top, excluded.top), data = excluded.data"
+                    " RETURNING rowid",
+                    (
+                        uuid,
+                        _timestamp(article["published_at"]),
+                        article.get("locale"),
+                        article.get("language"),
+                        int(top),
+                        json.dumps(article),
+                    ),
+                ).fetchone()
+                if known is None:
+                    new += 1
+                else:
+                    self._db.execute(
+                        "DELETE FROM article_categories WHERE uuid = ?", (uuid,)
+                    )
+                    self._db.execute(
+                        "DELETE FROM articles_text WHERE rowid = ?", (rowid,)
+                    )
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO article_categories VALUES (?, ?)",
+                    [(cat, uuid) for cat in article.get("categories") or []],
+                )
+                self._db.execute(
+                    "INSERT INTO articles_text"
+                    " (rowid, title, description, snippet, keywords)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (
+                        rowid,
+                        article.get("title") or "",
+                        article.get("description") or "",
+                        article.get("snippet") or "",
+                        article.get("keywords") or "",
+                    ),
+                )
+        return new
+
+    def _where(self, news_filter: NewsFilter):
+        clauses, params = [], []
+        dump = news_filter.model_dump(mode="json")
+        for field in ("locale", "language"):
+            if dump[field]:
+                clauses.append(f"{field} IN ({', '.join('?' * len(dump[field]))})")
+                params += dump[field]
+        if dump["categories"]:
+            marks = ", ".join("?" * len(dump["categories"]))
+            clauses.append(
+                "uuid IN (SELECT uuid FROM article_categories"
+                f" WHERE category IN ({marks}))"
+            )
+            params += dump["categories"]
+        if news_filter.top:
+            clauses.append("top = 1")
+        if news_filter.published_before is not None:
+            clauses.append("published_at < ?")
+            params.append(_timestamp(news_filter.published_before))
+        if news_filter.published_after is not None:
+            clauses.append("published_at > ?")
+            params.append(_timestamp(news_filter.published_after))
+        if news_filter.published_on is not None:
+            clauses.append("substr(published_at, 1, 10) = ?")
+            params.append(news_filter.published_on.strftime("%Y-%m-%d"))
+        if news_filter.search and news_filter.search.split():
+            clauses.append(
+                "rowid IN (SELECT rowid FROM articles_text WHERE articles_text MATCH ?)"
+            )
+            params.append(_match(news_filter.search))
+        return " AND ".join(clauses) or "1", params
+
+    def query(self, news_filter: NewsFilter):
+        """A page for the filter, shaped like a TheNewsAPI response."""
+        where, params = self._where(news_filter)
+        found = self._db.execute(
+            f"SELECT count(*) FROM articles WHERE {where}", params
+        ).fetchone()[0]
+        rows = self._db.execute(
+            f"SELECT data FROM articles WHERE {where}"
+            " ORDER BY published_at DESC, uuid LIMIT ? OFFSET ?",
+            params + [self.page_size, (news_filter.page - 1) * self.page_size],
+        ).fetchall()
+        data = [json.loads(row[0]) for row in rows]
+        meta = {
+            "found": found,
+            "returned": len(data),
+            "limit": self.page_size,
+            "page": news_filter.page,
+        }
+        return {"meta": meta, "data": data}
+
+    def get_news(self, news_filter: NewsFilter):
+        """Like NewsLoader.get_news, from the index."""
+        if news_filter.page > 19999:
+            raise ValueError("Page Limit Reached")
+        page = self.query(news_filter)
+        news_filter.count = page["meta"]["found"]
+        return page["data"]
+
+    def watermark(self, kind):
+        row = self._db.execute(
+            "SELECT published_at FROM watermarks WHERE kind = ?", (kind,)
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set_watermark(self, kind, published_at):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?)",
+                (kind, _timestamp(published_at)),
+            )
+
+    def gaps(self, kind):
+        """(published_after, published_before) still to ingest, newest first."""
+        rows = self._db.execute(
+            "SELECT published_after, published_before FROM ingest_gaps"
+            " WHERE kind = ? ORDER BY published_before DESC",
+            (kind,),
+        ).fetchall()
+        return [(datetime.fromisoformat(a), datetime.fromisoformat(b)) for a, b in rows]
+
+    def set_gap(self, kind, published_after, published_before, replaces=None):
+        with self._db:
+            if replaces is not None:
+                self._db.execute(
+                    "DELETE FROM ingest_gaps WHERE kind = ? AND published_before = ?",
+                    (kind, _timestamp(replaces)),
+                )
+            if published_before is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ingest_gaps VALUES (?, ?, ?)",
+                    (kind, _timestamp(published_after), _timestamp(published_before)),
+                )
+
+    def stats(self):
+        return {
+            "articles": self._db.execute("SELECT count(*) FROM articles").fetchone()[0],
+            "watermarks": dict(
+                self._db.execute("SELECT kind, published_at FROM watermarks")
+            ),
+            "gaps": self._db.execute("SELECT count(*) FROM ingest_gaps").fetchone()[0],
+        }
+
+    def close(self):
+        self._db.close()
+
+
+class IngestWorker:
+    """Polls TheNewsAPI for articles newer than the index's watermark.
+
+    Every `interval` seconds the top and all endpoints are paged, newest
+    first, with `published_after` set to the newest article indexed from
+    them. An empty index starts `backfill` ago. A poll reads at most
+    `max_pages` pages per endpoint; when that runs out before the oldest new
+    article, the rest is kept as a gap and paged by the following polls.
+    New articles are also added to `clusters`.
+    """
+
+    def __init__(
+        self,
+        index: ArticleIndex,
+        loader: NewsLoader,
+        news_filter: NewsFilter = None,
+        interval: float = NEWS_INGEST_INTERVAL,
+        max_pages: int = 10,
+        backfill: timedelta = timedelta(days=1),
+        clusters: StoryClusters = None,
+    ) -> None:
+        self.index = index
+        self.loader = loader
+        self.news_filter = news_filter or NewsFilter(locale=["us"], language=["en"])
+        self.interval = interval
+        self.max_pages = max_pages
+        self.backfill = backfill
+        self.clusters = clusters
+        self.ingested = 0
+        self.last_poll = None
+        self._task = None
+
+    def covers(self, news_filter: NewsFilter):
+        """Whether every article the filter can match is ingested."""
+        for field in ("locale", "language", "categories"):
+            ingested = getattr(self.news_filter, field)
+            if not ingested:
+                continue
+            wanted = getattr(news_filter, field)
+            if not wanted or not set(wanted) <= set(ingested):
+                return False
+        return True
+
+    async def _sweep(self, kind, after, before, pages):
+        """Page through articles published in (after, before), newest first.
+
+        Returns new articles, the newest and oldest published_at seen, whether
+        the range was read to its end, and the pages used.
+        """
+        top = kind == "top"
+        newest = oldest = None
+        new = 0
+        for page in range(1, pages + 1):
+            news_filter = self.news_filter.model_copy(
+                update={
+                    "top": top,
+                    "page": page,
+                    "published_after": after,
+                    "published_before": before,
+                }
+            )
+            response = await self.loader.request_page(news_filter)
+            if "error" in response:
+                print("news ingest failed", kind, response["error"])
+                return new, newest, oldest, False, page
+            articles = response["data"]
+            new += self.index.upsert(articles, top=top)
+            if self.clusters is not None:
+                self.clusters.add(articles)
+            for article in articles:
+                published = _timestamp(article["published_at"])
+                newest = max(newest or published, published)
+                oldest = min(oldest or published, published)
+            meta = response["meta"]
+            if not articles or page * meta["limit"] >= meta["found"]:
+                return new, newest, oldest, True, page
+        return new, newest, oldest, False, pages
+
+    def _older_than(self, oldest):
+        # articles sharing the oldest second may sit on the next page
+        return datetime.fromisoformat(oldest) + timedelta(seconds=1)
+
+    async def _poll_kind(self, kind):
+        watermark = self.index.watermark(kind)
+        if watermark is None:
+            watermark = datetime.utcnow().replace(microsecond=0) - self.backfill
+        pages = self.max_pages
+        new, newest, oldest, complete, used = await self._sweep(
+            kind, watermark, None, pages
+        )
+        pages -= used
+        if newest is not None:
+            if not complete:
+                self.index.set_gap(kind, watermark, self._older_than(oldest))
+            self.index.set_watermark(kind, newest)
+        for after, before in self.index.gaps(kind):
+            if pages <= 0:
+                break
+            gap_new, _, oldest, complete, used = await self._sweep(
+                kind, after, before, pages
+            )
+            pages -= used
+            new += gap_new
+            if complete:
+                self.index.set_gap(kind, after, None, replaces=before)
+            elif oldest is not None:
+                self.index.set_gap(
+                    kind, after, self._older_than(oldest), replaces=before
+                )
+        gaps = len(self.index.gaps(kind))
+        if gaps:
+            print(f"news ingest ran out of {kind} pages, {gaps} gaps left")
+        return new
+
+    async def poll(self):
+        """One pass over both endpoints, returns how many articles were new."""
+        new = 0
+        for kind in ("top", "all"):
+            new += await self._poll_kind(kind)
+        self.ingested += new
+        self.last_poll = time.time()
+        return new
+
+    async def _run(self):
+        while True:
+            try:
+                new = await self.poll()
+                print(f"news ingest: {new} new articles")
+            except Exception as e:
+                print("news ingest failed", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            **self.index.stats(),
+            "ingested": self.ingested,
+            "last_poll": self.last_poll,
+        }
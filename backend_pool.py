@@ -0,0 +1,192 @@
+import asyncio
+import time
+
+import metrics
+from openai import APIConnectionError, APIStatusError
+from utils import get_backends, get_client
+
+BACKEND_REQUESTS = metrics.REGISTRY.counter(
+    "llm_backend_requests_total",
+    "Model calls per backend and outcome.",
+    ("backend", "outcome"),
+)
+BACKEND_EJECTIONS = metrics.REGISTRY.counter(
+    "llm_backend_ejections_total",
+    "Times a backend was taken out of rotation.",
+    ("backend",),
+)
+
+
+def is_backend_failure(error):
+    """Errors that say the backend is unwell rather than the request being bad."""
+    if isinstance(error, APIConnectionError):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+class Backend:
+    def __init__(self, url, max_concurrency, max_retries=4) -> None:
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.client = get_client(url, max_retries=max_retries)
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def ejected(self):
+        return time.monotonic() < self.ejected_until
+
+    @property
+    def load(self):
+        return self.outstanding / self.max_concurrency
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "consecutive_failures": self.failures,
+            "ejected_for_s": round(max(0.0, self.ejected_until - time.monotonic()), 1),
+        }
+
+
+class BackendPool:
+    """Least-outstanding-requests dispatch over OpenAI-compatible backends.
+
+    Each call goes to the healthy backend with the lowest outstanding/limit
+    ratio and waits while every backend is at its limit. After `eject_after`
+    consecutive connection errors or 5xx responses a backend is ejected for
+    `eject_for` seconds; failed calls move on to another backend. With more
+    than one backend, `/models` is polled every `health_interval` seconds to
+    eject dead backends early and bring recovered ones back. If every backend
+    is ejected they all stay in rotation rather than failing every call.
+    """
+
+    def __init__(
+        self,
+        backends=None,
+        eject_after=3,
+        eject_for=30.0,
+        health_interval=10.0,
+        health_timeout=2.0,
+    ) -> None:
+        self.spec = backends
+        self.eject_after = eject_after
+        self.eject_for = eject_for
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._backends = None
+        self._freed = None
+        self._health = None
+
+    @property
+    def backends(self) -> list[Backend]:
+        # resolved on first use, so LLM_BASE_URL can still change after import
+        if self._backends is None:
+            spec = self._spec()
+            # the pool fails over itself, the client only retries a single backend
+            retries = 4 if len(spec) == 1 else 0
+            self._backends = [Backend(url, limit, retries) for url, limit in spec]
+        return self._backends
+
+    def _spec(self):
+        if self.spec is None or isinstance(self.spec, str):
+            return get_backends(self.spec)
+        return self.spec
+
+    def capacity(self):
+        """Calls the backends accept at once, together."""
+        if self._backends is not None:
+            return sum(backend.max_concurrency for backend in self._backends)
+        return sum(limit for _, limit in self._spec())
+
+    def _pick(self, exclude):
+        candidates = [b for b in self.backends if b not in exclude] or self.backends
+        candidates = [b for b in candidates if not b.ejected] or candidates
+        free = [b for b in candidates if b.outstanding < b.max_concurrency]
+        return min(free, key=lambda b: b.load) if free else None
+
+    async def acquire(self, exclude=()) -> Backend:
+        if self._freed is None:
+            self._freed = asyncio.Event()
+        if self._health is None and len(self.backends) > 1:
+            self._health = asyncio.ensure_future(self._health_checks())
+        while (backend := self._pick(exclude)) is None:
+            await self._freed.wait()
+        backend.outstanding += 1
+        return backend
+
+    def release(self, backend: Backend, error=None):
+        backend.outstanding -= 1
+        if error is None:
+            backend.failures = 0
+            BACKEND_REQUESTS.inc(backend=backend.url, outcome="ok")
+        elif is_backend_failure(error):
+            backend.failures += 1
+            BACKEND_REQUESTS.inc(backend=backend.url, outcome="failed")
+            if backend.failures >= self.eject_after and not backend.ejected:
+                self._eject(backend, error)
+        else:
+            BACKEND_REQUESTS.inc(backend=backend.url, outcome="error")
+        self._freed.set()
+        self._freed = asyncio.Event()
+
+    def _eject(self, backend: Backend, reason):
+        print(f"ejecting llm backend {backend.url} for {self.eject_for}s:", reason)
+        backend.ejected_until = time.monotonic() + self.eject_for
+        BACKEND_EJECTIONS.inc(backend=backend.url)
+
+    async def create(self, **request):
+        """Start a chat completion on the least loaded backend, failing over on errors.
+
+        Returns the backend with the response; release the backend once the
+        response (or stream) has been consumed.
+        """
+        tried = []
+        while True:
+            backend = await self.acquire(tried)
+            try:
+                response = await backend.client.chat.completions.create(**request)
+                return backend, response
+            except Exception as e:
+                self.release(backend, e)
+                tried.append(backend)
+                if not is_backend_failure(e) or len(tried) >= len(self.backends):
+                    raise
+                print(f"llm backend {backend.url} failed, trying another:", e)
+                metrics.RETRIES.inc(stage="llm_backend")
+            except BaseException:
+                self.release(backend)
+                raise
+
+    async def _check(self, backend: Backend):
+        try:
+            await backend.client.models.list(timeout=self.health_timeout)
+        except Exception as e:
+            if not backend.ejected:
+                self._eject(backend, e)
+            return
+        if backend.ejected or backend.failures:
+            print(f"llm backend {backend.url} is healthy again")
+            backend.ejected_until = 0.0
+            backend.failures = 0
+            self._freed.set()
+            self._freed = asyncio.Event()
+
+    async def _health_checks(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*(self._check(backend) for backend in self.backends))
+
+    def stats(self):
+        return [backend.stats() for backend in self.backends]
+
+    async def aclose(self):
+        if self._health is not None:
+            self._health.cancel()
+            self._health = None
+        for backend in self._backends or []:
+            await backend.client.close()
+        self._backends = None
+        self._freed = None
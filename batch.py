@@ -0,0 +1,179 @@
+"""Pre-generate posts for many articles, checkpointing results to JSONL.
+
+    python batch.py --articles articles.jsonl --platforms x facebook --out posts.jsonl
+    python batch.py --filter '{"categories": ["tech"]}' --pages 5 --platforms x --out posts.jsonl
+
+Finished (article, platform) pairs already in --out are skipped, so a crashed
+run resumes where it stopped by running the same command again.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from news_filters import NewsFilter
+from news_loader import NewsLoader
+from orchestrator import Orchestrator
+from styles import Style
+from summary_store import SummaryStore
+
+
+async def load_articles(args):
+    if args.articles:
+        with open(args.articles) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    news_filter = NewsFilter.model_validate_json(args.filter)
+    loader = NewsLoader()
+    articles = []
+    try:
+        for page in range(news_filter.page, news_filter.page + args.pages):
+            news_filter.page = page
+            articles += await loader.get_news(news_filter)
+    finally:
+        await loader.aclose()
+    return articles
+
+
+def load_done(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # a crash can leave the last line half written
+                continue
+            if "error" not in result:
+                done.add((result["uuid"], result["platform"]))
+    return done
+
+
+def end_with_newline(path):
+    # keep new results from being glued onto a half written last line
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+async def run_job(orca: Orchestrator, article, platform, options):
+    start = time.perf_counter()
+    result = {"uuid": article["uuid"], "platform": platform, "url": article["url"]}
+    try:
+        posts = []
+        async for event in orca.generate(article, Style(), platform, **options):
+            if event["event"] == "post_created":
+                posts.append(json.loads(event["data"]["post"]))
+        result["posts"] = posts
+    except Exception as e:
+        print("batch job failed", article["uuid"], platform, e)
+        result["error"] = repr(e)
+    result["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+async def run_batch(
+    orca: Orchestrator, jobs, out, concurrency, options, save_every=30.0
+):
+    limit = asyncio.Semaphore(concurrency)
+    results = {"done": 0, "failed": 0, "posts": 0, "articles": set()}
+    saved = time.monotonic()
+
+    async def job(article, platform):
+        nonlocal saved
+        async with limit:
+            result = await run_job(orca, article, platform, options)
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        # a killed run keeps the summaries it paid for
+        if time.monotonic() - saved >= save_every:
+            orca.summaries.save()
+            saved = time.monotonic()
+        if "error" in result:
+            results["failed"] += 1
+            return
+        results["done"] += 1
+        results["posts"] += len(result["posts"])
+        results["articles"].add(result["uuid"])
+        print(f"[{results['done']}/{len(jobs)}] {result['uuid']} {result['platform']}")
+
+    await asyncio.gather(*(job(article, platform) for article, platform in jobs))
+    return results
+
+
+async def main(args):
+    articles = await load_articles(args)
+    done = load_done(args.out)
+    end_with_newline(args.out)
+    jobs = [
+        (article, platform)
+        for article in articles
+        for platform in args.platforms
+        if (article["uuid"], platform) not in done
+    ]
+    print(
+        f"{len(articles)} articles, {len(done)} jobs already done, {len(jobs)} to run"
+    )
+
+    orca = Orchestrator(summaries=SummaryStore(path=args.summaries))
+    orca.summaries.load()
+    await orca.budget.aload()
+    # near-duplicate articles then share one summary
+    orca.clusters.add(articles)
+    options = {"mode": args.mode, "overgenerate": args.overgenerate}
+    start = time.perf_counter()
+    try:
+        with open(args.out, "a") as out:
+            results = await run_batch(
+                orca, jobs, out, args.concurrency, options, args.save_every
+            )
+    finally:
+        orca.summaries.save()
+        await orca.fetcher.aclose()
+        await orca.models.aclose()
+        orca.article_cache.close()
+    elapsed = time.perf_counter() - start
+
+    tokens = orca.models.prompt_tokens + orca.models.completion_tokens
+    print(
+        f"\n{results['done']} jobs done, {results['failed']} failed, "
+        f"{results['posts']} posts in {elapsed:.1f}s"
+    )
+    print(f"articles/min: {len(results['articles']) / elapsed * 60:.2f}")
+    print(
+        f"tokens/s: {tokens / elapsed:.1f} "
+        f"(completion {orca.models.completion_tokens / elapsed:.1f}/s)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--articles", help="JSONL file of TheNewsAPI articles")
+    source.add_argument("--filter", help="NewsFilter as JSON, fetched from the API")
+    parser.add_argument("--pages", type=int, default=1, help="pages to fetch")
+    parser.add_argument(
+        "--platforms",
+        nargs="+",
+        default=["generic"],
+        choices=["generic", "x", "instagram", "facebook"],
+    )
+    parser.add_argument("--out", required=True, help="JSONL results, appended to")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--mode", default="parallel", choices=["sequential", "parallel", "batched"]
+    )
+    parser.add_argument("--overgenerate", type=int, default=0, choices=range(0, 6))
+    parser.add_argument("--summaries", default=".cache/summaries.json")
+    parser.add_argument(
+        "--save-every", type=float, default=30.0, help="seconds between summary saves"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""Feed queries answered live by TheNewsAPI vs from the local article index.
+
+    python -m benchmarks.article_index [--stories 5000] [--latency 0.15]
+
+Ingests the stand-in's stories into a fresh index, polling until no backlog
+is left, publishes `--new` more and polls again from the watermark, then
+times the same feed queries live and from the index.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+import news_loader
+from article_index import ArticleIndex, IngestWorker
+from benchmarks.standins import news_app, percentile, report, serve
+from news_filters import NewsFilter
+from news_loader import NewsLoader
+
+QUERIES = {
+    "top, page 1": {},
+    "all, page 1": {"top": False},
+    "tech, page 20": {"top": False, "categories": ["tech"], "page": 20},
+    "search": {"top": False, "search": "story 4321"},
+    "published_after": {"top": False, "published_after": "2024-10-31T12:00:00"},
+}
+
+
+def news_filter(**options):
+    return NewsFilter.model_validate({"locale": ["us"], "language": ["en"], **options})
+
+
+async def ingest(news, index, args):
+    loader = NewsLoader()
+    worker = IngestWorker(
+        index, loader, max_pages=args.max_pages, backfill=timedelta(days=365 * 10)
+    )
+    rows = []
+    for name in ("initial", "incremental"):
+        if name == "incremental":
+            news.state.found += args.new
+        news.state.calls.clear()
+        start = time.perf_counter()
+        new = polls = 0
+        # polls after the first page the backlog the page limit left over
+        while polls == 0 or index.stats()["gaps"]:
+            new += await worker.poll()
+            polls += 1
+        rows.append(
+            {
+                "poll": name,
+                "polls": polls,
+                "new articles": new,
+                "upstream calls": sum(news.state.calls.values()),
+                "seconds": f"{time.perf_counter() - start:.2f}",
+            }
+        )
+
+    timings = []
+    for name, options in QUERIES.items():
+        for source in ("live", "index"):
+            latencies, found = [], 0
+            for _ in range(args.queries):
+                query = news_filter(**options)
+                start = time.perf_counter()
+                if source == "live":
+                    found = (await loader.request_page(query))["meta"]["found"]
+                else:
+                    index.get_news(query)
+                    found = query.count
+                latencies.append(time.perf_counter() - start)
+            timings.append(
+                {
+                    "query": name,
+                    "source": source,
+                    "found": found,
+                    "p50_ms": f"{percentile(latencies, 50) * 1000:.2f}",
+                    "p95_ms": f"{percentile(latencies, 95) * 1000:.2f}",
+                }
+            )
+    await loader.aclose()
+    return rows, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--stories", type=int, default=5000)
+    parser.add_argument("--new", type=int, default=50)
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--max-pages", type=int, default=10, help="pages per poll")
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    news = news_app(
+        "http://publisher.test",
+        per_page=args.per_page,
+        latency=args.latency,
+        found=args.stories,
+    )
+    index = ArticleIndex(os.path.join(tempfile.mkdtemp(), "news.db"))
+    with serve(news) as (news_base,):
+        news_loader.NEWS_API_URL = f"{news_base}/v1/news/"
+        rows, timings = asyncio.run(ingest(news, index, args))
+    index.close()
+    report(rows, list(rows[0]))
+    report(timings, list(timings[0]))
+
+
+if __name__ == "__main__":
+    main()
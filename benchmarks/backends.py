@@ -0,0 +1,99 @@
+"""LLM calls spread over 1, 2 and 4 stand-in inference boxes, and failover.
+
+    python -m benchmarks.backends [--calls 96] [--slots 2]
+
+Each stand-in box generates `--slots` completions at a time, so throughput
+should grow with the number of boxes. The failover runs pair a healthy box
+with one answering 503s and with one that is not listening at all.
+"""
+
+import argparse
+import asyncio
+import time
+from contextlib import ExitStack
+
+from outlines.caching import disable_cache
+
+from backend_pool import BACKEND_EJECTIONS, BackendPool
+from benchmarks.standins import bind_sockets, llm_app, report, serve
+from llm_registry import ModelRegistry
+
+
+async def run_calls(backends, calls, concurrency):
+    models = ModelRegistry(pool=BackendPool(backends, health_interval=0.5))
+    generator = models.text(1.6)
+    limit = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def call(idx):
+        nonlocal failed
+        async with limit:
+            try:
+                await models.complete(generator, f"post {idx}")
+            except Exception:
+                failed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(idx) for idx in range(calls)))
+    elapsed = time.perf_counter() - start
+    await models.aclose()
+    return elapsed, failed
+
+
+def ejections():
+    return sum(BACKEND_EJECTIONS.values.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--calls", type=int, default=96)
+    parser.add_argument("--slots", type=int, default=2)
+    parser.add_argument("--tokens-per-s", type=float, default=200)
+    args = parser.parse_args()
+    disable_cache()
+
+    rows = []
+    with ExitStack() as stack:
+        apps = [
+            llm_app(latency=0.05, tokens_per_s=args.tokens_per_s, slots=args.slots)
+            for _ in range(4)
+        ]
+        urls = [f"{stack.enter_context(serve(app))[0]}/v1" for app in apps]
+        # a port nobody listens on
+        closed = bind_sockets()[0]
+        down = f"http://127.0.0.1:{closed.getsockname()[1]}/v1"
+        closed.close()
+
+        def run(name, backends, calls=args.calls):
+            for app in apps:
+                app.state.calls.clear()
+            before = ejections()
+            elapsed, failed = asyncio.run(
+                run_calls(backends, calls, concurrency=4 * args.slots * len(backends))
+            )
+            served = [sum(app.state.calls.values()) for app in apps]
+            rows.append(
+                {
+                    "backends": name,
+                    "calls": calls,
+                    "failed": failed,
+                    "calls/s": f"{calls / elapsed:.1f}",
+                    "served per box": " ".join(map(str, served)),
+                    "ejections": ejections() - before,
+                }
+            )
+
+        for count in (1, 2, 4):
+            run(f"{count} healthy", [(url, args.slots) for url in urls[:count]])
+
+        apps[1].state.healthy = False
+        run("1 healthy + 1 503", [(urls[0], args.slots), (urls[1], args.slots)])
+        apps[1].state.healthy = True
+        run("1 healthy + 1 down", [(urls[0], args.slots), (down, args.slots)])
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Near-duplicate clustering of feed refreshes, MinHash LSH vs pairwise Jaccard.
+
+    python -m benchmarks.clustering [--sizes 1000 5000 20000] [--copies 4]
+
+Each refresh holds wire stories republished by `--copies` outlets with a
+word or two changed per field, plus as many unrelated stories. Reports the time to
+cluster the refresh, pair precision and recall against the true stories,
+and how many summaries generation needs with clusters sharing one. The
+pairwise baseline compares every article with every cluster found so far,
+so it only runs up to `--pairwise-max` articles.
+"""
+
+import argparse
+import itertools
+import random
+import time
+
+from benchmarks.standins import report
+from similarity import StoryClusters, article_text, jaccard, shingles
+
+VOCABULARY = [f"w{idx}" for idx in range(20_000)]
+
+
+def rewrite(words, changes, rng: random.Random):
+    words = list(words)
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return words
+
+
+def corpus(size, copies, rng: random.Random):
+    articles, stories = [], []
+    story = 0
+    while len(articles) < size:
+        title = rng.choices(VOCABULARY, k=10)
+        description = rng.choices(VOCABULARY, k=25)
+        snippet = rng.choices(VOCABULARY, k=60)
+        outlets = copies if story % 2 == 0 else 1
+        for outlet in range(outlets):
+            articles.append(
+                {
+                    "uuid": f"{story}-{outlet}",
+                    "title": " ".join(rewrite(title, 1, rng) + [f"outlet{outlet}"]),
+                    "description": " ".join(rewrite(description, 1, rng)),
+                    "snippet": " ".join(rewrite(snippet, 2, rng)),
+                }
+            )
+            stories.append(story)
+        story += 1
+    return articles[:size], stories[:size]
+
+
+def pairwise(articles, threshold=0.5):
+    clusters, labels = [], []
+    for article in articles:
+        shingled = shingles(article_text(article))
+        for idx, other in enumerate(clusters):
+            if jaccard(shingled, other) >= threshold:
+                labels.append(idx)
+                break
+        else:
+            clusters.append(shingled)
+            labels.append(len(clusters) - 1)
+    return labels
+
+
+def pairs(labels):
+    groups = {}
+    for idx, label in enumerate(labels):
+        groups.setdefault(label, []).append(idx)
+    return {
+        pair
+        for members in groups.values()
+        for pair in itertools.combinations(members, 2)
+    }
+
+
+def score(name, articles, stories, cluster):
+    start = time.perf_counter()
+    labels = cluster(articles)
+    elapsed = time.perf_counter() - start
+    found, true = pairs(labels), pairs(stories)
+    return {
+        "articles": len(articles),
+        "method": name,
+        "ms": f"{elapsed * 1000:.0f}",
+        "articles/s": f"{len(articles) / elapsed:.0f}",
+        "precision": f"{len(found & true) / len(found) if found else 1.0:.3f}",
+        "recall": f"{len(found & true) / len(true) if true else 1.0:.3f}",
+        "stories": len(set(stories)),
+        "summaries": len(set(labels)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--copies", type=int, default=4)
+    parser.add_argument("--pairwise-max", type=int, default=5000)
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        articles, stories = corpus(size, args.copies, random.Random(size))
+        rows.append(
+            score(
+                "minhash lsh",
+                articles,
+                stories,
+                lambda articles: StoryClusters().add(articles),
+            )
+        )
+        if size <= args.pairwise_max:
+            rows.append(score("pairwise", articles, stories, pairwise))
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
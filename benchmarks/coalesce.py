@@ -0,0 +1,85 @@
+"""Backend calls when many clients generate posts for the same article at once.
+
+python -m benchmarks.coalesce [--clients 1 10 50]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from outlines.caching import disable_cache
+
+import utils
+from article_cache import ArticleCache
+from benchmarks.standins import llm_app, publisher_app, report, serve
+from orchestrator import Orchestrator
+from streaming_json import ItemFeed
+from styles import Style
+from summary_store import SummaryStore
+
+
+class NoFlight:
+    async def do(self, key, fn, *args):
+        return await fn(*args)
+
+    def feed(self, key, fn, *args):
+        return ItemFeed(fn(*args))
+
+
+async def client(orca, article):
+    events = [event["event"] async for event in orca.generate(article, Style(), "x")]
+    return events.count("reading_article")
+
+
+async def bench(publisher, calls, clients, coalesce):
+    calls.clear()
+    orca = Orchestrator(
+        article_cache=ArticleCache(tempfile.mkdtemp()), summaries=SummaryStore()
+    )
+    if not coalesce:
+        orca.flights = NoFlight()
+    article = {
+        "uuid": "trending",
+        "url": f"{publisher}/article/1",
+        "title": "Trending story",
+        "description": "Everyone is reading this",
+        "snippet": "A snippet",
+    }
+    start = time.perf_counter()
+    reading = await asyncio.gather(*(client(orca, article) for _ in range(clients)))
+    wall = time.perf_counter() - start
+    await orca.fetcher.aclose()
+    await orca.models.aclose()
+    return {
+        "clients": clients,
+        "coalesced": coalesce,
+        "reading_events": sum(reading),
+        "article_fetches": orca.article_cache.misses,
+        "summary_calls": calls["Summaries"],
+        "style_calls": calls["Styles"],
+        "post_calls": calls["text"],
+        "wall_s": f"{wall:.2f}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+    disable_cache()
+
+    rows = []
+    llm = llm_app(latency=0.2)
+    with serve(publisher_app(delay=0.1)) as (publisher,), serve(llm) as (llm_base,):
+        utils.LLM_BASE_URL = f"{llm_base}/v1"
+        for clients in args.clients:
+            for coalesce in (False, True):
+                rows.append(
+                    asyncio.run(bench(publisher, llm.state.calls, clients, coalesce))
+                )
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
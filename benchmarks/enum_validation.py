@@ -0,0 +1,70 @@
+"""Validation and enum serialization cost of the Option models (Style, NewsFilter).
+
+    python -m benchmarks.enum_validation [--payloads 100000]
+
+Payloads mix enum names, enum values, lists and missing fields the way the
+frontend and the model's JSON send them.
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.standins import report
+from news_filters import CategoryChoice, LanguageChoice, LocaleChoice, NewsFilter
+from styles import Style
+
+
+def style_payload(rng: random.Random):
+    payload = {}
+    for key, choices in Style.get_options().items():
+        if rng.random() < 0.2:
+            continue
+        choice = rng.choice(choices)
+        payload[key] = choice.name if rng.random() < 0.7 else choice.value
+    return payload
+
+
+def filter_payload(rng: random.Random):
+    return {
+        "locale": [rng.choice(list(LocaleChoice)).name],
+        "language": [rng.choice(list(LanguageChoice)).name],
+        "categories": [choice.name for choice in rng.sample(list(CategoryChoice), k=3)],
+        "page": rng.randint(1, 10),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payloads", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    styles = [style_payload(rng) for _ in range(args.payloads)]
+    filters = [filter_payload(rng) for _ in range(args.payloads)]
+
+    rows = []
+
+    def measure(name, fn, items):
+        start = time.perf_counter()
+        results = [fn(item) for item in items]
+        elapsed = time.perf_counter() - start
+        rows.append(
+            {
+                "operation": name,
+                "calls": len(items),
+                "total_s": f"{elapsed:.2f}",
+                "us/call": f"{elapsed / len(items) * 1_000_000:.1f}",
+            }
+        )
+        return results
+
+    validated = measure("Style validate", lambda p: Style(**p), styles)
+    measure("NewsFilter validate", lambda p: NewsFilter(**p), filters)
+    measure("Style.get_enums", Style.get_enums, validated)
+    measure("Style.get_enum_names", Style.get_enum_names, validated)
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Article text extraction: BeautifulSoup get_text vs main-content extraction.
+
+    python -m benchmarks.extraction [--corpus saved_pages/]
+
+Without --corpus a set of synthetic publisher pages is used.
+"""
+
+import argparse
+import glob
+import json
+import random
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.standins import report
+from extraction import extract_main_content
+
+
+def count_tokens(text):
+    try:
+        import tiktoken
+
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except Exception:
+        return len(text) // 4
+
+
+def synthetic_page(idx, rng: random.Random):
+    words = [f"word{n}" for n in range(300)]
+
+    def sentence(n=14):
+        return " ".join(rng.choices(words, k=n)).capitalize() + "."
+
+    links = "".join(f"<li><a href='/s/{n}'>Section {n}</a></li>" for n in range(60))
+    tracking = json.dumps({"events": [sentence() for _ in range(80)]})
+    paragraphs = "".join(
+        f"<p>{' '.join(sentence() for _ in range(4))}</p>"
+        for _ in range(rng.randint(8, 40))
+    )
+    related = "".join(f"<li><a href='/r/{n}'>{sentence(8)}</a></li>" for n in range(20))
+    comments = "".join(f"<div class='comment'>{sentence(20)}</div>" for _ in range(30))
+    return (
+        f"<html><head><title>Story {idx}</title><style>body {{margin: 0}}</style>"
+        f"<script>window.dataLayer = {tracking};</script></head><body>"
+        f"<header><nav><ul>{links}</ul></nav></header>"
+        "<div id='cookie-consent'>We use cookies to improve your experience. "
+        "By continuing you accept our policy. <button>Accept all</button></div>"
+        f"<main><article><h1>Story {idx}</h1><p class='byline'>By A Reporter</p>"
+        f"{paragraphs}<div class='share-tools'>Share on X Share on Facebook</div>"
+        f"</article></main><aside class='related'><ul>{related}</ul></aside>"
+        f"<section class='comments'>{comments}</section>"
+        "<div class='newsletter'>Subscribe to our newsletter for daily updates.</div>"
+        f"<footer>{links}<p>Copyright Publisher</p></footer></body></html>"
+    )
+
+
+def load_corpus(path, size):
+    if path:
+        pages = []
+        for name in sorted(glob.glob(f"{path}/**/*.htm*", recursive=True)):
+            with open(name, encoding="utf-8", errors="replace") as f:
+                pages.append(f.read())
+        return pages
+    rng = random.Random(0)
+    return [synthetic_page(idx, rng) for idx in range(size)]
+
+
+def soup_text(html):
+    return " ".join(BeautifulSoup(html, "html.parser").get_text().split())
+
+
+def main_text(html):
+    return extract_main_content(html).text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", help="directory of saved .html pages")
+    parser.add_argument("--size", type=int, default=50, help="synthetic pages")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.size)
+    rows = []
+    for name, extract in {"bs4 get_text": soup_text, "main content": main_text}.items():
+        start = time.perf_counter()
+        texts = [extract(page) for page in pages]
+        elapsed = time.perf_counter() - start
+        rows.append(
+            {
+                "extractor": name,
+                "pages": len(pages),
+                "ms/page": f"{elapsed / len(pages) * 1000:.2f}",
+                "chars/page": sum(map(len, texts)) // len(pages),
+                "prompt_tokens/page": sum(map(count_tokens, texts)) // len(pages),
+            }
+        )
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
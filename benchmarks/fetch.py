@@ -0,0 +1,101 @@
+"""Article fetching: blocking requests in the threadpool vs the pooled async fetcher.
+
+python -m benchmarks.fetch [--delay 0.2] [--hosts 10]
+"""
+
+import argparse
+import asyncio
+import time
+
+import requests
+from starlette.concurrency import run_in_threadpool
+
+from benchmarks.standins import percentile, publisher_app, report, serve
+from fetcher import HEADERS, ArticleFetcher
+
+
+async def timed(fetch, url):
+    start = time.perf_counter()
+    await fetch(url)
+    return time.perf_counter() - start
+
+
+async def probe_threadpool(done):
+    # how long unrelated threadpool work waits while the fetches are in flight
+    waits = []
+    while not done.is_set():
+        start = time.perf_counter()
+        await run_in_threadpool(time.sleep, 0)
+        waits.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return max(waits, default=0.0)
+
+
+async def run(fetch, urls):
+    done = asyncio.Event()
+    probe = asyncio.create_task(probe_threadpool(done))
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(fetch, url) for url in urls))
+    wall = time.perf_counter() - start
+    done.set()
+    return wall, sorted(latencies), await probe
+
+
+def blocking_fetch(url):
+    return requests.get(url, allow_redirects=True, headers=HEADERS, timeout=15).text
+
+
+async def bench(bases, concurrency):
+    urls = [f"{bases[i % len(bases)]}/article/{i}" for i in range(concurrency)]
+    fetcher = ArticleFetcher()
+    modes = {
+        "requests+threadpool": lambda url: run_in_threadpool(blocking_fetch, url),
+        "async pooled": fetcher.fetch,
+    }
+    rows = []
+    for mode, fetch in modes.items():
+        # warm the pool so keep-alive reuse is what gets measured
+        await run(fetch, urls[: len(bases)])
+        wall, latencies, pool_wait = await run(fetch, urls)
+        rows.append(
+            {
+                "concurrency": concurrency,
+                "mode": mode,
+                "wall_s": f"{wall:.3f}",
+                "p50_s": f"{percentile(latencies, 50):.3f}",
+                "p95_s": f"{percentile(latencies, 95):.3f}",
+                "fetches/s": f"{concurrency / wall:.1f}",
+                "threadpool_wait_s": f"{pool_wait:.3f}",
+            }
+        )
+    await fetcher.aclose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--hosts", type=int, default=10)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    rows = []
+    with serve(publisher_app(delay=args.delay), hosts=args.hosts) as bases:
+        for level in args.levels:
+            rows += asyncio.run(bench(bases, level))
+    report(
+        rows,
+        [
+            "concurrency",
+            "mode",
+            "wall_s",
+            "p50_s",
+            "p95_s",
+            "fetches/s",
+            "threadpool_wait_s",
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
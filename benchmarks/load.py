@@ -0,0 +1,204 @@
+"""End-to-end load benchmark of /api/feed and /api/generate against local stand-ins.
+
+    python -m benchmarks.load [--levels 1 4 16] [--save baseline.json]
+    python -m benchmarks.load --baseline baseline.json [--tolerance 0.2]
+
+Starts publisher, TheNewsAPI and OpenAI-compatible stand-ins plus the app
+itself, then runs virtual users (load the feed, generate posts for an article)
+at increasing concurrency. Reports p50/p95/p99 per stage and requests/s. With
+--baseline it exits non-zero when a p95 or the throughput regresses by more
+than --tolerance, so it can gate performance changes.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+import news_loader
+import utils
+from article_cache import ArticleCache
+from benchmarks.standins import (
+    llm_app,
+    news_app,
+    percentile,
+    publisher_app,
+    report,
+    serve,
+)
+from orchestrator import Orchestrator
+from presummarizer import PreSummarizer
+
+# styles stream into post writing since styles are parsed incrementally, so
+# style selection and the first post are timed together
+STAGES = {
+    "reading_article": "summarize",
+    "determining_styles": "styles_first_post",
+}
+# events that don't end the stage in progress
+PASSING = {"post_delta", "writing_posts", "queued"}
+
+
+def events(buffer):
+    decoder = json.JSONDecoder()
+    found, pos = [], 0
+    while pos < len(buffer):
+        try:
+            event, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            break
+        found.append(event)
+        pos = end
+    return found, buffer[pos:]
+
+
+async def virtual_user(client: httpx.AsyncClient, user, options, timings):
+    start = time.perf_counter()
+    params = {"locale": "us", "language": "en", "categories": "tech"}
+    feed = await client.get("/api/feed", params={**params, "page": user + 1})
+    feed.raise_for_status()
+    timings["feed"].append(time.perf_counter() - start)
+
+    start = last = time.perf_counter()
+    stage = None
+    buffer = ""
+    body = {"article": user % 3, "platform": "x", **options}
+    async with client.stream("POST", "/api/generate", json=body) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_text():
+            found, buffer = events(buffer + chunk)
+            for event in found:
+                now = time.perf_counter()
+                name = event["event"]
+                if name in PASSING:
+                    continue
+                if stage is not None:
+                    timings[stage].append(now - last)
+                    stage = None
+                if name in STAGES:
+                    stage, last = STAGES[name], now
+                elif name == "post_created":
+                    stage, last = "next_post", now
+    timings["generate"].append(time.perf_counter() - start)
+
+
+async def cold_start(app):
+    """Swap in an orchestrator with no cached bodies or summaries, closing the old."""
+    await app.state.presummarizer.aclose()
+    orca = app.state.orca
+    await orca.fetcher.aclose()
+    await orca.models.aclose()
+    orca.article_cache.close()
+    app.state.orca = Orchestrator(article_cache=ArticleCache(tempfile.mkdtemp()))
+    app.state.presummarizer = PreSummarizer(app.state.orca)
+
+
+async def run_level(base, users, options):
+    timings = defaultdict(list)
+    async with httpx.AsyncClient(base_url=base, timeout=600) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(virtual_user(client, user, options, timings) for user in range(users))
+        )
+        wall = time.perf_counter() - start
+    return wall, timings
+
+
+def summarize(users, wall, timings):
+    results = {"users": users, "rps": users / wall, "stages": {}}
+    for stage, values in timings.items():
+        values = sorted(values)
+        results["stages"][stage] = {
+            f"p{pct}": percentile(values, pct) for pct in (50, 95, 99)
+        }
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    previous = {str(level["users"]): level for level in baseline}
+    for level in results:
+        old = previous.get(str(level["users"]))
+        if old is None:
+            continue
+        if level["rps"] < old["rps"] * (1 - tolerance):
+            found.append(
+                f"{level['users']} users rps {old['rps']:.2f} -> {level['rps']:.2f}"
+            )
+        for stage, values in level["stages"].items():
+            before = old["stages"].get(stage, {}).get("p95")
+            if before and values["p95"] > before * (1 + tolerance):
+                found.append(
+                    f"{level['users']} users {stage} p95 {before:.3f}s -> {values['p95']:.3f}s"
+                )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="LLM time to first token"
+    )
+    parser.add_argument("--tokens-per-s", type=float, default=100, help="LLM tokens/s")
+    parser.add_argument("--news-latency", type=float, default=0.05)
+    parser.add_argument("--mode", default="sequential")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--save", help="write results as a baseline json")
+    parser.add_argument("--baseline", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    import main as app_main
+
+    llm = llm_app(latency=args.latency, tokens_per_s=args.tokens_per_s)
+    options = {"mode": args.mode, "stream": args.stream}
+    results = []
+    with serve(publisher_app(delay=0.05)) as (publisher,), serve(llm) as (llm_base,):
+        news = news_app(publisher, latency=args.news_latency)
+        with serve(news) as (news_base,), serve(app_main.app) as (base,):
+            utils.LLM_BASE_URL = f"{llm_base}/v1"
+            news_loader.NEWS_API_URL = f"{news_base}/v1/news/"
+            for users in args.levels:
+                # every level starts cold, on the app's loop that owns its clients
+                asyncio.run_coroutine_threadsafe(
+                    cold_start(app_main.app), app_main.app.state.loop
+                ).result()
+                wall, timings = asyncio.run(run_level(base, users, options))
+                results.append(summarize(users, wall, timings))
+
+    rows = []
+    for level in results:
+        for stage, values in level["stages"].items():
+            rows.append(
+                {
+                    "users": level["users"],
+                    "rps": f"{level['rps']:.2f}",
+                    "stage": stage,
+                    **{pct: f"{value:.3f}" for pct, value in values.items()},
+                }
+            )
+    report(rows, ["users", "rps", "stage", "p50", "p95", "p99"])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for regression in found:
+            print("REGRESSION", regression)
+        if found:
+            sys.exit(1)
+        print("no regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Per-request model setup: fresh clients and generators vs the registry.
+
+python -m benchmarks.model_setup [--requests 200]
+"""
+
+import argparse
+import time
+
+from outlines import generate
+
+from benchmarks.standins import report
+from llm_registry import ModelRegistry
+from styles import Styles
+from summary import Summaries
+from utils import get_model
+
+
+def fresh_setup(_):
+    # what one generation used to build: summary, styles and five posts
+    generate.json(get_model(), Summaries)
+    generate.json(get_model(0.8), Styles)
+    for _ in range(5):
+        generate.text(get_model(1.6))
+
+
+def registry_setup(registry):
+    registry.json(Summaries)
+    registry.json(Styles, 0.8)
+    for _ in range(5):
+        registry.text(1.6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = []
+    registry = ModelRegistry()
+    for mode, setup in {"fresh": fresh_setup, "registry": registry_setup}.items():
+        setup(registry)
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            setup(registry)
+        per_request = (time.perf_counter() - start) / args.requests
+        rows.append(
+            {
+                "mode": mode,
+                "requests": args.requests,
+                "us/request": f"{per_request * 1e6:.1f}",
+            }
+        )
+    report(rows, ["mode", "requests", "us/request"])
+
+
+if __name__ == "__main__":
+    main()
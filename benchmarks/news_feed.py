@@ -0,0 +1,117 @@
+"""Feed views, fresh connections vs the cached NewsLoader vs cache plus prefetch.
+
+    python -m benchmarks.news_feed [--views 60] [--latency 0.15] [--think 0.3]
+
+A simulated user reads each page for `--think` seconds, then pages on. The
+"back and forth" walk steps one page forward or back, the "forward" walk reads
+straight through the feed. The fresh path is the previous loader: a new
+`requests.get` per view, always against the `all` endpoint. The prefetch
+path also fetches the next page in the background after each view.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import requests
+
+import news_loader
+from benchmarks.standins import news_app, percentile, report, serve
+from news_filters import NewsFilter
+from news_loader import NewsLoader, PagePrefetcher
+
+
+def back_and_forth(views, pages, seed=0):
+    rng = random.Random(seed)
+    page, path = 1, []
+    for _ in range(views):
+        path.append(page)
+        page = min(max(page + rng.choice((-1, 1, 1)), 1), pages)
+    return path
+
+
+def news_filter(page):
+    return NewsFilter(locale=["us"], language=["en"], categories=["tech"], page=page)
+
+
+async def fresh(path, think):
+    latencies = []
+    for page in path:
+        params = news_filter(page).model_dump(exclude_defaults=True, exclude_unset=True)
+        start = time.perf_counter()
+        requests.get(
+            news_loader.NEWS_API_URL + "all",
+            auth=("api_token", ""),
+            params=params,
+        ).json()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(think)
+    return latencies, None
+
+
+async def cached(path, think, prefetch=False):
+    loader = NewsLoader()
+    prefetcher = PagePrefetcher(loader, rate=5) if prefetch else None
+    latencies = []
+    for page in path:
+        view = news_filter(page)
+        start = time.perf_counter()
+        await loader.get_news(view)
+        latencies.append(time.perf_counter() - start)
+        if prefetcher is not None:
+            prefetcher.after(view)
+        await asyncio.sleep(think)
+    if prefetcher is not None:
+        prefetcher.close()
+    await loader.aclose()
+    return latencies, loader.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--views", type=int, default=60)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--think", type=float, default=0.3)
+    args = parser.parse_args()
+
+    walks = {
+        "back and forth": back_and_forth(args.views, args.pages),
+        "forward": list(range(1, args.views + 1)),
+    }
+    loaders = {
+        "fresh": fresh,
+        "cached": cached,
+        "prefetch": lambda path, think: cached(path, think, prefetch=True),
+    }
+    news = news_app("http://publisher.test", latency=args.latency)
+    rows = []
+    with serve(news) as (news_base,):
+        news_loader.NEWS_API_URL = f"{news_base}/v1/news/"
+        for walk, path in walks.items():
+            for name, run in loaders.items():
+                news.state.calls.clear()
+                latencies, stats = asyncio.run(run(path, args.think))
+                rows.append(
+                    {
+                        "walk": walk,
+                        "loader": name,
+                        "views": len(path),
+                        "upstream calls": " ".join(
+                            f"{kind}={count}"
+                            for kind, count in news.state.calls.items()
+                        ),
+                        "hit_rate": f"{stats['hit_rate']:.2f}" if stats else "-",
+                        "prefetches_used": stats["prefetches_used"] if stats else "-",
+                        "p50_ms": f"{percentile(latencies, 50) * 1000:.1f}",
+                        "p95_ms": f"{percentile(latencies, 95) * 1000:.1f}",
+                    }
+                )
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Post writing latency and prompt tokens per generation mode.
+
+python -m benchmarks.post_modes [--latency 0.3] [--tokens-per-s 50]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import utils
+from article_cache import ArticleCache
+from benchmarks.standins import llm_app, publisher_app, report, serve
+from orchestrator import Orchestrator
+from styles import Style
+
+MODES = {
+    "sequential": {"mode": "sequential"},
+    "parallel": {"mode": "parallel"},
+    "parallel+2": {"mode": "parallel", "overgenerate": 2},
+    "batched": {"mode": "batched"},
+}
+
+
+async def bench(publisher, name, options, runs):
+    orca = Orchestrator(article_cache=ArticleCache(tempfile.mkdtemp()))
+    latencies, prompt_tokens, posts = [], 0, 0
+    for run in range(runs):
+        article = {
+            "uuid": f"{name}-{run}",
+            "url": f"{publisher}/article/{run}",
+            "title": "Story",
+            "description": "Description",
+            "snippet": "Snippet",
+        }
+        async for event in orca.generate(article, Style(), "x", **options):
+            if event["event"] == "writing_posts":
+                start = time.perf_counter()
+                tokens_before = orca.models.prompt_tokens
+            posts += event["event"] == "post_created"
+        latencies.append(time.perf_counter() - start)
+        prompt_tokens += orca.models.prompt_tokens - tokens_before
+    await orca.fetcher.aclose()
+    await orca.models.aclose()
+    return {
+        "mode": name,
+        "posts/run": f"{posts / runs:.1f}",
+        "posts_s": f"{sum(latencies) / runs:.2f}",
+        "post_prompt_tokens/run": prompt_tokens // runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-s", type=float, default=50)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    llm = llm_app(latency=args.latency, tokens_per_s=args.tokens_per_s)
+    with serve(publisher_app(delay=0.05)) as (publisher,), serve(llm) as (llm_base,):
+        utils.LLM_BASE_URL = f"{llm_base}/v1"
+        rows = [
+            asyncio.run(bench(publisher, name, options, args.runs))
+            for name, options in MODES.items()
+        ]
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Generation after a feed view, with and without pre-summarizing the top articles.
+
+    python -m benchmarks.presummarize [--top-k 3] [--think 0 6]
+
+A user loads a feed page of 6 articles, reads for `--think` seconds, then
+generates posts for the first article and for the last, which is below the
+pre-summarized top K. Reports the time until styles are being determined
+(the summary is ready) and until the first post, per article.
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+from outlines.caching import disable_cache
+
+import metrics
+import utils
+from article_cache import ArticleCache
+from benchmarks.standins import llm_app, publisher_app, report, serve
+from orchestrator import Orchestrator
+from presummarizer import PreSummarizer
+from styles import Style
+
+
+def feed(publisher, run):
+    rng = random.Random(run)
+    words = [f"w{idx}" for idx in range(5000)]
+    return [
+        {
+            "uuid": f"{run}-{idx}",
+            "url": f"{publisher}/article/{idx}",
+            "title": " ".join(rng.choices(words, k=8)),
+            "description": " ".join(rng.choices(words, k=20)),
+            "snippet": " ".join(rng.choices(words, k=40)),
+        }
+        for idx in range(6)
+    ]
+
+
+async def generation(orca, article):
+    start = time.perf_counter()
+    styles = first_post = None
+    async for event in orca.generate(article, Style(), "x"):
+        if event["event"] == "determining_styles" and styles is None:
+            styles = time.perf_counter() - start
+        if event["event"] == "post_created" and first_post is None:
+            first_post = time.perf_counter() - start
+    return styles, first_post
+
+
+async def bench(publisher, run, top_k, think):
+    orca = Orchestrator(article_cache=ArticleCache(tempfile.mkdtemp()))
+    presummarizer = PreSummarizer(orca, top_k=top_k)
+    articles = feed(publisher, run)
+    presummarizer.after_feed(articles)
+    await asyncio.sleep(think)
+    results = {}
+    for name, article in (("top", articles[0]), ("below top k", articles[-1])):
+        results[name] = await generation(orca, article)
+    await presummarizer.aclose()
+    await orca.fetcher.aclose()
+    await orca.models.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--think", type=float, nargs="+", default=[0, 6])
+    parser.add_argument("--tokens-per-s", type=float, default=200)
+    args = parser.parse_args()
+    disable_cache()
+
+    rows = []
+    llm = llm_app(latency=0.2, tokens_per_s=args.tokens_per_s)
+    with serve(publisher_app(delay=0.1)) as (publisher,), serve(llm) as (llm_base,):
+        utils.LLM_BASE_URL = f"{llm_base}/v1"
+        run = 0
+        for think in args.think:
+            for top_k in (0, args.top_k):
+                run += 1
+                results = asyncio.run(bench(publisher, run, top_k, think))
+                for name, (styles, first_post) in results.items():
+                    rows.append(
+                        {
+                            "think_s": think,
+                            "top_k": top_k,
+                            "article": name,
+                            "summary_ready_s": f"{styles:.2f}",
+                            "first_post_s": f"{first_post:.2f}",
+                        }
+                    )
+    report(rows, list(rows[0]))
+    print(
+        "pre-summaries:",
+        {labels[0]: count for labels, count in metrics.PRESUMMARIES.values.items()},
+    )
+
+
+if __name__ == "__main__":
+    main()
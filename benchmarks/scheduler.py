@@ -0,0 +1,101 @@
+"""One client's generations next to another client's burst, with and without
+the model call scheduler.
+
+    python -m benchmarks.scheduler [--burst 6] [--slots 4]
+
+A greedy client starts `--burst` generations at once, a polite client starts
+one generation just after. The stand-in LLM generates `--slots` completions at
+a time. Passed straight through, every call queues at the inference box in
+arrival order, so the polite client waits behind the whole burst. Scheduled,
+at most `--slots` calls run and the next free slot goes to the client with
+the fewest running calls.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from outlines.caching import disable_cache
+
+from article_cache import ArticleCache
+from backend_pool import BackendPool
+from benchmarks.standins import llm_app, publisher_app, percentile, report, serve
+from llm_registry import ModelRegistry
+from orchestrator import Orchestrator
+from scheduler import Scheduler
+from styles import Style
+
+
+async def generation(orca, publisher, idx, client, results):
+    article = {
+        "uuid": f"{client}-{idx}",
+        "url": f"{publisher}/article/{idx}",
+        "title": "Story",
+        "description": "Description",
+        "snippet": "Snippet",
+    }
+    start = time.perf_counter()
+    first, queued = None, 0
+    async for event in orca.generate(article, Style(), "x", client=client):
+        if event["event"] == "post_created" and first is None:
+            first = time.perf_counter() - start
+        queued += event["event"] == "queued"
+    results.append((client, first, time.perf_counter() - start, queued))
+
+
+async def bench(llm_base, publisher, max_concurrency, burst):
+    # the pool limit is lifted so the scheduler is the only queue in front of
+    # the stand-in box
+    models = ModelRegistry(
+        pool=BackendPool([(f"{llm_base}/v1", 1000)]),
+        scheduler=Scheduler(max_concurrency=max_concurrency),
+    )
+    orca = Orchestrator(models=models, article_cache=ArticleCache(tempfile.mkdtemp()))
+    results = []
+    greedy = [
+        asyncio.ensure_future(generation(orca, publisher, idx, "greedy", results))
+        for idx in range(burst)
+    ]
+    await asyncio.sleep(0.05)
+    await generation(orca, publisher, burst, "polite", results)
+    await asyncio.gather(*greedy)
+    await orca.fetcher.aclose()
+    await orca.models.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--burst", type=int, default=6)
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--tokens-per-s", type=float, default=100)
+    args = parser.parse_args()
+    disable_cache()
+
+    rows = []
+    llm = llm_app(latency=0.1, tokens_per_s=args.tokens_per_s, slots=args.slots)
+    with serve(publisher_app(delay=0.05)) as (publisher,), serve(llm) as (llm_base,):
+        for name, limit in (("passthrough", 10**6), ("scheduled", args.slots)):
+            results = asyncio.run(bench(llm_base, publisher, limit, args.burst))
+            for client in ("polite", "greedy"):
+                firsts = [r[1] for r in results if r[0] == client]
+                totals = [r[2] for r in results if r[0] == client]
+                rows.append(
+                    {
+                        "scheduler": name,
+                        "client": client,
+                        "generations": len(totals),
+                        "first_post_p50_s": f"{percentile(firsts, 50):.2f}",
+                        "total_p50_s": f"{percentile(totals, 50):.2f}",
+                        "total_max_s": f"{max(totals):.2f}",
+                        "queued_events": sum(r[3] for r in results if r[0] == client),
+                    }
+                )
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
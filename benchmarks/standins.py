@@ -0,0 +1,289 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# benchmarks import the app modules the same way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def bind_sockets(count=1):
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        sockets.append(sock)
+    return sockets
+
+
+@contextmanager
+def serve(app, hosts=1):
+    """Run an ASGI app in a background thread, yielding one base url per socket."""
+    sockets = bind_sockets(hosts)
+    server = uvicorn.Server(
+        uvicorn.Config(app, log_level="warning", backlog=4096, timeout_keep_alive=30)
+    )
+    thread = threading.Thread(target=server.run, kwargs={"sockets": sockets})
+    thread.daemon = True
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    # lets a benchmark run coroutines on the app's own event loop
+    app.state.loop = server.servers[0].get_loop()
+    try:
+        yield [f"http://127.0.0.1:{sock.getsockname()[1]}" for sock in sockets]
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def article_html(idx, paragraphs=40):
+    body = "".join(
+        f"<p>Paragraph {n} of article {idx}: the quick brown fox jumps over the lazy dog.</p>"
+        for n in range(paragraphs)
+    )
+    return (
+        "<html><head><title>Article</title><script>var tracking = 1;</script></head>"
+        "<body><nav><a href='/'>Home</a><a href='/world'>World</a></nav>"
+        f"<article><h1>Article {idx}</h1>{body}</article>"
+        "<footer>Copyright Publisher</footer></body></html>"
+    )
+
+
+def publisher_app(delay=0.2, chunks=4):
+    """Publisher stand-in that trickles each page out over `delay` seconds."""
+
+    async def page(request):
+        idx = request.path_params["idx"]
+        wait = float(request.query_params.get("delay", delay))
+        html = article_html(idx).encode()
+        step = max(1, len(html) // chunks)
+
+        async def trickle():
+            for start in range(0, len(html), step):
+                await asyncio.sleep(wait / chunks)
+                yield html[start : start + step]
+
+        return StreamingResponse(trickle(), media_type="text/html; charset=utf-8")
+
+    return Starlette(routes=[Route("/article/{idx}", page)])
+
+
+STYLE = {
+    "audience": "general",
+    "purpose": "invite",
+    "length_preference": "balanced",
+    "voice": "third_person",
+    "position": "neutral",
+    "tone": "formal",
+}
+
+
+def completion_kind(payload):
+    response_format = payload.get("response_format") or {}
+    schema = response_format.get("json_schema", {}).get("schema", {})
+    return schema.get("title", "text")
+
+
+VOCABULARY = [f"word{n}" for n in range(500)]
+
+
+def fake_completion(kind, words):
+    text = " ".join(random.choices(VOCABULARY, k=words))
+    if kind == "Summaries":
+        summary = {"Missing_Entities": ["entity"], "Denser_Summary": text}
+        return json.dumps({"summaries": [summary] * 5})
+    if kind == "Styles":
+        return json.dumps({"styles": [STYLE] * 5})
+    if kind == "Posts":
+        posts = [
+            {"text": " ".join(random.choices(VOCABULARY, k=words // 3))}
+            for _ in range(5)
+        ]
+        return json.dumps({"posts": posts})
+    return text
+
+
+def llm_app(
+    latency=0.05, tokens_per_s=500.0, words=40, calls: Counter = None, slots=None
+):
+    """OpenAI-compatible chat completions stand-in, counting calls per schema.
+
+    `latency` is the time to first token, after which tokens (4 characters
+    each) are produced at `tokens_per_s`, streamed when the request asks for it.
+    With `slots` only that many completions are generated at once, the rest
+    queue like on a single inference box. Set `app.state.healthy = False` to
+    answer every request with a 503.
+    """
+    calls = Counter() if calls is None else calls
+    # created lazily, on the server's event loop
+    limit = {}
+
+    @asynccontextmanager
+    async def slot():
+        if slots is None:
+            yield
+            return
+        if "slot" not in limit:
+            limit["slot"] = asyncio.Semaphore(slots)
+        async with limit["slot"]:
+            yield
+
+    def unavailable():
+        return JSONResponse({"error": "backend unavailable"}, status_code=503)
+
+    def chunk(payload, created, **choice):
+        return {
+            "id": f"chatcmpl-{created}",
+            "object": "chat.completion",
+            "created": created,
+            "model": payload["model"],
+            "choices": [{"index": 0, **choice}],
+        }
+
+    async def models(request):
+        if not app.state.healthy:
+            return unavailable()
+        return JSONResponse({"object": "list", "data": [{"id": "stand-in"}]})
+
+    async def completions(request):
+        if not app.state.healthy:
+            return unavailable()
+        payload = await request.json()
+        kind = completion_kind(payload)
+        calls[kind] += 1
+        prompt = "".join(msg["content"] for msg in payload["messages"])
+        content = fake_completion(kind, words)
+        tokens = [content[i : i + 4] for i in range(0, len(content), 4)]
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(tokens),
+            "total_tokens": len(prompt) // 4 + len(tokens),
+        }
+        created = int(time.time())
+
+        if not payload.get("stream"):
+            async with slot():
+                await asyncio.sleep(latency + len(tokens) / tokens_per_s)
+            message = {"role": "assistant", "content": content}
+            body = chunk(payload, created, message=message, finish_reason="stop")
+            return JSONResponse({**body, "usage": usage})
+
+        async def events():
+            async with slot():
+                await asyncio.sleep(latency)
+                for token in tokens:
+                    delta = chunk(
+                        payload, created, delta={"content": token}, finish_reason=None
+                    )
+                    yield f"data: {json.dumps({**delta, 'object': 'chat.completion.chunk'})}\n\n"
+                    await asyncio.sleep(1 / tokens_per_s)
+            last = chunk(payload, created, delta={}, finish_reason="stop")
+            last = {**last, "object": "chat.completion.chunk", "usage": usage}
+            yield f"data: {json.dumps(last)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app = Starlette(
+        routes=[
+            Route("/v1/chat/completions", completions, methods=["POST"]),
+            Route("/v1/models", models),
+        ]
+    )
+    app.state.calls = calls
+    app.state.healthy = True
+    return app
+
+
+NEWS_CATEGORIES = ["general", "tech", "business", "sports", "science", "health"]
+
+
+def news_app(publisher, per_page=3, latency=0.05, found=1000, calls: Counter = None):
+    """TheNewsAPI stand-in; article urls point at a publisher stand-in.
+
+    Story n is published n minutes after midnight on 2024-10-30, the newest
+    first, so raising `app.state.found` publishes new stories. Every third
+    story is also a top story. Only `page`, `published_after` and
+    `published_before` are applied.
+    Calls are counted per endpoint, top or all.
+    """
+    calls = Counter() if calls is None else calls
+    epoch = datetime(2024, 10, 30)
+
+    def story(n):
+        return {
+            "uuid": f"story-{n}",
+            "title": f"Story {n}",
+            "description": f"What happened in story {n}",
+            "keywords": "",
+            "snippet": f"Snippet of story {n}",
+            "url": f"{publisher}/article/{n}",
+            "image_url": "",
+            "language": "en",
+            "published_at": (epoch + timedelta(minutes=n)).isoformat() + ".000000Z",
+            "source": "publisher.test",
+            "categories": [NEWS_CATEGORIES[n % len(NEWS_CATEGORIES)]],
+            "locale": "us",
+        }
+
+    async def news(request):
+        await asyncio.sleep(latency)
+        page = int(request.query_params.get("page", 1))
+        kind = request.path_params["kind"]
+        calls[kind] += 1
+        stories = range(app.state.found - 1, -1, -1)
+        if kind == "top":
+            stories = [n for n in stories if n % 3 == 0]
+        after = request.query_params.get("published_after")
+        if after:
+            oldest = (datetime.fromisoformat(after) - epoch) // timedelta(minutes=1)
+            stories = [n for n in stories if n > oldest]
+        before = request.query_params.get("published_before")
+        if before:
+            newest = (datetime.fromisoformat(before) - epoch) / timedelta(minutes=1)
+            stories = [n for n in stories if n < newest]
+        data = [story(n) for n in stories[(page - 1) * per_page : page * per_page]]
+        meta = {
+            "found": len(stories),
+            "returned": len(data),
+            "limit": per_page,
+            "page": page,
+        }
+        return JSONResponse({"meta": meta, "data": data})
+
+    app = Starlette(routes=[Route("/v1/news/{kind}", news)])
+    app.state.calls = calls
+    app.state.found = found
+    return app
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def report(rows, columns):
+    widths = [max(len(col), *(len(f"{row[col]}") for row in rows)) for col in columns]
+    print("  ".join(col.ljust(width) for col, width in zip(columns, widths)))
+    for row in rows:
+        print(
+            "  ".join(f"{row[col]}".ljust(width) for col, width in zip(columns, widths))
+        )
@@ -0,0 +1,60 @@
+"""Time to first visible post content, with and without token streaming.
+
+python -m benchmarks.streaming [--latency 0.3] [--tokens-per-s 30]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import utils
+from article_cache import ArticleCache
+from benchmarks.standins import llm_app, publisher_app, report, serve
+from orchestrator import Orchestrator
+from styles import Style
+
+
+async def bench(publisher, stream):
+    orca = Orchestrator(article_cache=ArticleCache(tempfile.mkdtemp()))
+    article = {
+        "uuid": f"streaming-{stream}",
+        "url": f"{publisher}/article/1",
+        "title": "Story",
+        "description": "Description",
+        "snippet": "Snippet",
+    }
+    first_content = first_post = None
+    async for event in orca.generate(article, Style(), "x", stream=stream):
+        if event["event"] == "writing_posts":
+            start = time.perf_counter()
+        elif event["event"] in ("post_delta", "post_created") and first_content is None:
+            first_content = time.perf_counter() - start
+        if event["event"] == "post_created" and first_post is None:
+            first_post = time.perf_counter() - start
+    total = time.perf_counter() - start
+    await orca.fetcher.aclose()
+    await orca.models.aclose()
+    return {
+        "stream": stream,
+        "first_content_s": f"{first_content:.2f}",
+        "first_post_s": f"{first_post:.2f}",
+        "all_posts_s": f"{total:.2f}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-s", type=float, default=30)
+    args = parser.parse_args()
+
+    llm = llm_app(latency=args.latency, tokens_per_s=args.tokens_per_s)
+    with serve(publisher_app(delay=0.05)) as (publisher,), serve(llm) as (llm_base,):
+        utils.LLM_BASE_URL = f"{llm_base}/v1"
+        rows = [asyncio.run(bench(publisher, stream)) for stream in (False, True)]
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
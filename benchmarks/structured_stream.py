@@ -0,0 +1,151 @@
+"""Structured outputs parsed whole vs incrementally from the token stream.
+
+    python -m benchmarks.structured_stream [--samples 200]
+
+Measures when the first and the last Style are available from a style
+completion served by a stand-in LLM, and how many styles (and style fields)
+survive damaged completions: truncated, an unterminated string, a missing
+comma. The whole-output path is schema validation with the return_modeled
+fallback; the incremental path is the streaming item parser.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+
+from outlines.caching import disable_cache
+from pydantic_core import ValidationError
+
+from benchmarks.standins import llm_app, report, serve
+from llm_registry import ModelRegistry
+from streaming_json import ItemParser
+from styles import Style, Styles
+from utils import return_modeled
+
+
+async def first_and_last(base, streamed):
+    models = ModelRegistry(f"{base}/v1")
+    generator = models.json(Styles, 0.8)
+    start = time.perf_counter()
+    try:
+        if not streamed:
+            styles = await models.complete(generator, "style selection")
+            elapsed = time.perf_counter() - start
+            return elapsed, elapsed, len(styles.styles)
+        first, count = None, 0
+        async for _ in models.stream_items(
+            generator, "style selection", Style, "styles"
+        ):
+            count += 1
+            first = first or time.perf_counter() - start
+        return first, time.perf_counter() - start, count
+    finally:
+        await models.aclose()
+
+
+def completion(rng: random.Random):
+    styles = []
+    for _ in range(5):
+        style = {
+            key: rng.choice(choices).name
+            for key, choices in Style.get_options().items()
+        }
+        styles.append(style)
+    return json.dumps({"styles": styles}, indent=rng.choice([None, 2]))
+
+
+def damage(text, kind, rng: random.Random):
+    if kind == "truncated":
+        return text[: int(len(text) * rng.uniform(0.3, 0.95))]
+    if kind == "unterminated string":
+        quotes = [idx for idx, char in enumerate(text) if char == '"']
+        # drop a closing quote of a value
+        idx = rng.choice(quotes[3::4])
+        return text[:idx] + text[idx + 1 :]
+    if kind == "missing comma":
+        commas = [idx for idx in range(len(text)) if text.startswith("},", idx)]
+        idx = rng.choice(commas)
+        return text[: idx + 1] + text[idx + 2 :]
+    return text
+
+
+def fields(styles):
+    return sum(len(style.get_enum_names()) for style in styles)
+
+
+def whole(text):
+    try:
+        return Styles.model_validate_json(text).styles
+    except ValidationError as e:
+        try:
+            return return_modeled(Styles, e.errors()).styles
+        except Exception:
+            return []
+
+
+def incremental(text):
+    parser = ItemParser()
+    items = []
+    for idx in range(0, len(text), 4):
+        items += parser.feed(text[idx : idx + 4])
+    styles = []
+    for item in items + parser.close():
+        try:
+            styles.append(Style.model_validate(item))
+        except ValidationError:
+            pass
+    return styles
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--tokens-per-s", type=float, default=100)
+    args = parser.parse_args()
+    disable_cache()
+
+    rows = []
+    llm = llm_app(latency=0.2, tokens_per_s=args.tokens_per_s)
+    with serve(llm) as (base,):
+        for name, streamed in (("whole", False), ("incremental", True)):
+            first, last, count = asyncio.run(first_and_last(base, streamed))
+            rows.append(
+                {
+                    "parser": name,
+                    "styles": count,
+                    "first_style_s": f"{first:.2f}",
+                    "all_styles_s": f"{last:.2f}",
+                }
+            )
+    report(rows, list(rows[0]))
+
+    rng = random.Random(0)
+    rows = []
+    for kind in ("intact", "truncated", "unterminated string", "missing comma"):
+        texts = [damage(completion(rng), kind, rng) for _ in range(args.samples)]
+        for name, parse in (("whole", whole), ("incremental", incremental)):
+            start = time.perf_counter()
+            # both paths print what they repair
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = [parse(text) for text in texts]
+            elapsed = time.perf_counter() - start
+            rows.append(
+                {
+                    "damage": kind,
+                    "parser": name,
+                    "styles/completion": f"{sum(map(len, results)) / len(texts):.2f}",
+                    "fields/completion": f"{sum(map(fields, results)) / len(texts):.1f}",
+                    "ms/completion": f"{elapsed / len(texts) * 1000:.2f}",
+                }
+            )
+    report(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
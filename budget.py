@@ -0,0 +1,98 @@
+import asyncio
+import math
+import re
+
+from utils import COMPLETION_TOKENS, MODEL_CONTEXT, MODEL_NAME
+
+SENTENCES = re.compile(r"(?<=[.!?])\s+")
+
+
+class TokenBudget:
+    """Token counting and chunking against the configured model's context window.
+
+    The tokenizer is loaded off the event loop by `aload` at startup; until
+    then, or when it can't be loaded, about three characters per token are
+    assumed. tiktoken only knows OpenAI models, so its counts for any other
+    model are scaled up by `mismatch`, and `margin` leaves room on top.
+    """
+
+    def __init__(
+        self,
+        context_window: int = MODEL_CONTEXT,
+        completion_tokens: int = COMPLETION_TOKENS,
+        chunk_tokens: int = 2048,
+        margin: float = 0.85,
+        mismatch: float = 1.3,
+        model: str = MODEL_NAME,
+    ) -> None:
+        self.context_window = context_window
+        self.completion_tokens = completion_tokens
+        self.chunk_tokens = chunk_tokens
+        self.margin = margin
+        self.mismatch = mismatch
+        self.model = model
+        self.encoding = None
+        # the encoding is the model's own, counts need no scaling
+        self.exact = False
+
+    def load(self):
+        """Load the tokenizer, blocking; tiktoken may download its BPE file."""
+        try:
+            import tiktoken
+
+            try:
+                encoding = tiktoken.encoding_for_model(self.model)
+                exact = True
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+                exact = False
+        except Exception as e:
+            print("no tokenizer available, estimating tokens", e)
+            return
+        self.encoding, self.exact = encoding, exact
+
+    async def aload(self, timeout=10.0):
+        """Load the tokenizer in a thread, estimating meanwhile if it takes long."""
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self.load), timeout)
+        except asyncio.TimeoutError:
+            print("tokenizer still loading, estimating tokens meanwhile")
+
+    def count(self, text):
+        encoding = self.encoding
+        if encoding is None:
+            return len(text) // 3 + 1
+        tokens = len(encoding.encode(text, disallowed_special=()))
+        return tokens if self.exact else math.ceil(tokens * self.mismatch)
+
+    @property
+    def prompt_tokens(self):
+        return int(self.context_window * self.margin) - self.completion_tokens
+
+    def fits(self, prompt):
+        return self.count(prompt) <= self.prompt_tokens
+
+    def chunks(self, text, size):
+        """Split text on sentence boundaries into pieces of at most `size` tokens."""
+        chunks, current, used = [], [], 0
+        for sentence in SENTENCES.split(text):
+            tokens = self.count(sentence)
+            if tokens > size:
+                # a single run-on "sentence" (tables, lists) is split by words
+                words = sentence.split()
+                step = max(1, len(words) * size // tokens)
+                pieces = [
+                    " ".join(words[i : i + step]) for i in range(0, len(words), step)
+                ]
+            else:
+                pieces = [sentence]
+            for piece in pieces:
+                tokens = self.count(piece)
+                if current and used + tokens > size:
+                    chunks.append(" ".join(current))
+                    current, used = [], 0
+                current.append(piece)
+                used += tokens
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
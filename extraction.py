@@ -0,0 +1,180 @@
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+
+SKIP_TAGS = {
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "iframe",
+    "nav",
+    "header",
+    "footer",
+    "aside",
+    "form",
+    "button",
+    "select",
+}
+BLOCK_TAGS = {
+    "p",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "li",
+    "blockquote",
+    "pre",
+    "td",
+    "figcaption",
+    "div",
+    "section",
+    "article",
+    "main",
+}
+MAIN_TAGS = {"article", "main"}
+HIDDEN_TAGS = {"script", "style", "noscript", "template", "svg"}
+# end tags a page may leave out, so a skip started on one might never end
+OPTIONAL_END_TAGS = {"li", "p", "dt", "dd", "option", "tr", "td", "th"}
+# never skipped for their class, WordPress puts "comments-open" on <body>
+KEEP_TAGS = MAIN_TAGS | {"html", "body"} | OPTIONAL_END_TAGS
+VOID_TAGS = {"br", "img", "hr", "meta", "link", "input", "source", "wbr", "col"}
+BOILERPLATE = re.compile(
+    r"cookie|consent|gdpr|banner|newsletter|subscribe|promo|advert|\bads?\b|"
+    r"social|share|related|recommend|comment|sidebar|menu|breadcrumb|"
+    r"footer|navbar|popup|modal|paywall",
+    re.IGNORECASE,
+)
+
+
+def _chars(text):
+    # whitespace is left out, joining blocks adds separators the page didn't have
+    return len("".join(text.split()))
+
+
+@dataclass
+class Extraction:
+    text: str
+    total_chars: int
+    kept_chars: int
+
+    @property
+    def removed_chars(self):
+        return self.total_chars - self.kept_chars
+
+
+class _MainContentParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self.page = []
+        self.total_chars = 0
+        # open elements as [tag, why skipped]: None, "tag" or "class"
+        self._stack = []
+        self._skipped = 0
+        self._hidden = 0
+        self._main_depth = 0
+        self._block = []
+        self._links = 0
+        self._in_link = 0
+
+    def _flush(self):
+        text = " ".join("".join(self._block).split())
+        if text:
+            self.blocks.append((text, self._main_depth > 0, self._links))
+        self._block = []
+        self._links = 0
+
+    def _pop(self):
+        tag, skip = self._stack.pop()
+        if not self._skipped and tag in BLOCK_TAGS:
+            self._flush()
+        if skip:
+            self._skipped -= 1
+        if tag in HIDDEN_TAGS:
+            self._hidden -= 1
+        if tag in MAIN_TAGS:
+            self._main_depth -= 1
+        if tag == "a":
+            self._in_link -= 1
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        if tag in OPTIONAL_END_TAGS and self._stack and self._stack[-1][0] == tag:
+            # <li>One<li>Two closes the first item
+            self._pop()
+        marker = " ".join(v for k, v in attrs if k in ("id", "class", "role") and v)
+        skip = None
+        if tag in SKIP_TAGS:
+            skip = "tag"
+        elif tag not in KEEP_TAGS and BOILERPLATE.search(marker):
+            skip = "class"
+        if tag in MAIN_TAGS:
+            # wrappers like <div class="site has-sidebar"> hold the article
+            for entry in self._stack:
+                if entry[1] == "class":
+                    entry[1] = None
+                    self._skipped -= 1
+        if not self._skipped and tag in BLOCK_TAGS:
+            self._flush()
+        self._stack.append([tag, skip])
+        if skip:
+            self._skipped += 1
+        if tag in HIDDEN_TAGS:
+            self._hidden += 1
+        if tag in MAIN_TAGS:
+            self._main_depth += 1
+        if tag == "a":
+            self._in_link += 1
+
+    def handle_endtag(self, tag):
+        # closing a parent also closes children whose end tags were left out
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth][0] == tag:
+                while len(self._stack) > depth:
+                    self._pop()
+                return
+
+    def handle_data(self, data):
+        text = " ".join(data.split())
+        self.total_chars += _chars(text)
+        if text and not self._hidden:
+            self.page.append(text)
+        if self._skipped:
+            return
+        self._block.append(data)
+        if self._in_link:
+            self._links += len(data)
+
+    def close(self):
+        super().close()
+        while self._stack:
+            self._pop()
+        self._flush()
+
+
+def extract_main_content(html, min_words=8, max_link_density=0.5):
+    """Keep the article text of a page, dropping navigation and boilerplate."""
+    parser = _MainContentParser()
+    parser.feed(html)
+    parser.close()
+
+    def is_content(text, links):
+        return len(text.split()) >= min_words and links / len(text) <= max_link_density
+
+    main = [text for text, in_main, links in parser.blocks if in_main]
+    if sum(len(text) for text in main) < 200:
+        main = [text for text, _, links in parser.blocks if is_content(text, links)]
+    if not main:
+        main = [text for text, _, _ in parser.blocks]
+    text = "\n".join(main)
+    if len(text.split()) < min_words:
+        # the heuristics dropped the article itself, better the whole page
+        text = " ".join(parser.page)
+    return Extraction(
+        text=text, total_chars=parser.total_chars, kept_chars=_chars(text)
+    )
@@ -0,0 +1,97 @@
+import asyncio
+import codecs
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import httpx
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:131.0) Gecko/20100101 Firefox/131.0",
+    "X-Requested-With": "XMLHTTPSRequest",
+}
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    text: str = ""
+    headers: dict[str, str] = field(default_factory=dict)
+    truncated: bool = False
+
+
+class ArticleFetcher:
+    """Shared keep-alive pool for publisher pages, awaited on the event loop."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_per_host: int = 4,
+        max_bytes: int = 2_000_000,
+        timeout: float = 15,
+    ) -> None:
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._client = None
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=HEADERS,
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.timeout, connect=5),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[host]
+
+    def _decoder(self, response: httpx.Response):
+        try:
+            return codecs.getincrementaldecoder(response.encoding or "utf-8")("replace")
+        except LookupError:
+            return codecs.getincrementaldecoder("utf-8")("replace")
+
+    async def _read(self, url, headers):
+        async with self.client.stream("GET", url, headers=headers) as response:
+            decoder = self._decoder(response)
+            parts = []
+            size = 0
+            truncated = False
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > self.max_bytes:
+                    chunk = chunk[: len(chunk) - (size - self.max_bytes)]
+                    truncated = True
+                parts.append(decoder.decode(chunk))
+                if truncated:
+                    break
+            parts.append(decoder.decode(b"", final=True))
+            return FetchResult(
+                url=str(response.url),
+                status=response.status_code,
+                text="".join(parts),
+                headers=dict(response.headers),
+                truncated=truncated,
+            )
+
+    async def fetch(self, url, headers: dict[str, str] | None = None) -> FetchResult:
+        async with self._host_limit(url):
+            # the per-read timeout alone lets a trickling server hold the slot
+            return await asyncio.wait_for(self._read(url, headers), self.timeout)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
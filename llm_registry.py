@@ -0,0 +1,134 @@
+from dataclasses import asdict
+
+import metrics
+from backend_pool import BackendPool
+from outlines import generate
+from pydantic_core import ValidationError
+from scheduler import LLM_MAX_CONCURRENCY, Scheduler
+from streaming_json import ItemParser
+from utils import get_model
+
+
+class ModelRegistry:
+    """Compiled generators built once, dispatched over a pool of backends.
+
+    Generators are keyed by (schema, temperature, sampling params). Their
+    calls wait for a scheduler slot, then run on the server's event loop
+    through the pooled client of whichever backend the pool picks. `backends`
+    is a list of (base url, max concurrent requests) or a spec string, see
+    `utils.get_backends`.
+    """
+
+    def __init__(
+        self, backends=None, pool: BackendPool = None, scheduler: Scheduler = None
+    ) -> None:
+        self.pool = pool or BackendPool(backends)
+        if scheduler is None:
+            # calls beyond what the backends accept would wait in the pool,
+            # outside the scheduler's priorities and fairness
+            capacity = self.pool.capacity()
+            scheduler = Scheduler(min(LLM_MAX_CONCURRENCY or capacity, capacity))
+        self.scheduler = scheduler
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._generators = {}
+
+    def client(self):
+        return self.pool.backends[0].client
+
+    def _key(self, kind, temperature, sampling):
+        return (kind, temperature, tuple(sorted(sampling.items())))
+
+    def json(self, schema, temperature=0.75, **sampling):
+        key = self._key(schema, temperature, sampling)
+        if key not in self._generators:
+            model = get_model(temperature, self.client(), **sampling)
+            self._generators[key] = generate.json(model, schema)
+        return self._generators[key]
+
+    def text(self, temperature=0.75, **sampling):
+        key = self._key("text", temperature, sampling)
+        if key not in self._generators:
+            model = get_model(temperature, self.client(), **sampling)
+            self._generators[key] = generate.text(model)
+        return self._generators[key]
+
+    def _count(self, stage, prompt_tokens, completion_tokens):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        metrics.record_tokens(stage, prompt_tokens, completion_tokens)
+
+    async def complete(self, generator, prompt, stage="other"):
+        async with self.scheduler.slot(stage):
+            backend, response = await self.pool.create(
+                messages=[{"role": "user", "content": prompt}],
+                **asdict(generator.config),
+            )
+            self.pool.release(backend)
+        if response.usage is not None:
+            usage = response.usage
+            self._count(stage, usage.prompt_tokens, usage.completion_tokens)
+        return generator.format_sequence(response.choices[0].message.content)
+
+    async def stream(self, generator, prompt, stage="other"):
+        deltas = 0
+        async with self.scheduler.slot(stage):
+            backend, response = await self.pool.create(
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **asdict(generator.config),
+            )
+            error = None
+            try:
+                async for chunk in response:
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                        self._count(stage, usage.prompt_tokens, usage.completion_tokens)
+                        deltas = 0
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        deltas += 1
+                        yield chunk.choices[0].delta.content
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                # the backend stays busy until the stream is consumed or dropped
+                self.pool.release(backend, error)
+                await response.close()
+        # servers that report no usage while streaming send about a token per delta
+        self._count(stage, 0, deltas)
+
+    async def stream_items(self, generator, prompt, item_model, field, stage="other"):
+        """Stream a json generator's completion, yielding each list item as it closes.
+
+        Items failing `item_model` validation are skipped. When no item could be
+        picked out of the stream, the whole completion is parsed with the
+        generator's schema and its `field` items are yielded instead, raising
+        ValidationError like `complete` does.
+        """
+        parser = ItemParser()
+        parts = []
+        found = 0
+
+        def validated(items):
+            for item in items:
+                try:
+                    yield item_model.model_validate(item)
+                except ValidationError as e:
+                    print("skipping invalid streamed item", e)
+
+        async for delta in self.stream(generator, prompt, stage):
+            parts.append(delta)
+            for item in validated(parser.feed(delta)):
+                found += 1
+                yield item
+        for item in validated(parser.close()):
+            found += 1
+            yield item
+        if not found:
+            for item in getattr(generator.format_sequence("".join(parts)), field):
+                yield item
+
+    async def aclose(self):
+        await self.pool.aclose()
+        self._generators.clear()
@@ -1,23 +1,64 @@
-import asyncio
-from typing import Annotated
+from contextlib import asynccontextmanager
+from typing import Annotated, Literal
 
-import nest_asyncio
-from fastapi import Body, FastAPI, Query, Request
-from fastapi.responses import FileResponse
+import metrics
+import profiler
+import scheduler
+from article_index import NEWS_INDEX, ArticleIndex, IngestWorker
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from news_filters import NewsFilter
-from news_loader import NewsLoader
+from news_loader import NewsLoader, PagePrefetcher
 from orchestrator import Orchestrator
+from presummarizer import PreSummarizer
 from styles import Style
-from utils import JSONStreamingResponse
+from summary_store import SummaryStore
+from utils import JSONStreamingResponse, PrecomputedJSON
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.orca.summaries.load()
+    await app.state.orca.budget.aload()
+    if app.state.ingest is not None:
+        app.state.ingest.start()
+    yield
+    if app.state.ingest is not None:
+        await app.state.ingest.stop()
+        app.state.article_index.close()
+    app.state.orca.summaries.save()
+    app.state.prefetcher.close()
+    await app.state.presummarizer.aclose()
+    await app.state.news_loader.aclose()
+    await app.state.orca.fetcher.aclose()
+    await app.state.orca.models.aclose()
+    app.state.orca.article_cache.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+app.state.orca = Orchestrator(summaries=SummaryStore(path=".cache/summaries.json"))
+app.state.presummarizer = PreSummarizer(app.state.orca)
 app.state.news_loader = NewsLoader()
-app.state.orca = Orchestrator()
+app.state.prefetcher = PagePrefetcher(app.state.news_loader)
+app.state.article_index = ArticleIndex(NEWS_INDEX) if NEWS_INDEX else None
+app.state.ingest = (
+    IngestWorker(
+        app.state.article_index,
+        app.state.news_loader,
+        clusters=app.state.orca.clusters,
+    )
+    if NEWS_INDEX
+    else None
+)
+# the option lists only change on deploy
+app.state.options = PrecomputedJSON(
+    {**NewsFilter.get_json_options(), **Style.get_json_options()}
+)
 
 
 @app.get("/favicon.ico", include_in_schema=False)
@@ -32,15 +73,75 @@ async def index(request: Request):
 
 @app.get("/api/options")
 async def get_options(request: Request):
-    news_options = NewsFilter.get_json_options()
-    style_options = Style.get_json_options()
-    return {**news_options, **style_options}
+    return app.state.options.response(request)
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats(request: Request):
+    return {
+        "articles": app.state.orca.article_cache.stats(),
+        "summaries": app.state.orca.summaries.stats(),
+        "news": app.state.news_loader.stats(),
+        "index": app.state.ingest.stats() if app.state.ingest is not None else None,
+        "clusters": app.state.orca.clusters.stats(),
+        "presummaries": app.state.presummarizer.stats(),
+    }
+
+
+@app.get("/api/backends")
+async def get_backends(request: Request):
+    models = app.state.orca.models
+    return {"backends": models.pool.stats(), "scheduler": models.scheduler.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/api/admin/profiles")
+async def get_profiles(request: Request):
+    if not profiler.authorized(request):
+        raise HTTPException(status_code=403, detail="Profile token required")
+    return {"profiles": profiler.list_profiles()}
+
+
+@app.get("/api/admin/profiles/{file}")
+async def get_profile(request: Request, file: str):
+    if not profiler.authorized(request):
+        raise HTTPException(status_code=403, detail="Profile token required")
+    path = profiler.profile_path(file)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No such profile")
+    return FileResponse(path, media_type="text/plain")
 
 
 @app.get("/api/feed")
 async def get_news(request: Request, news_filter: Annotated[NewsFilter, Query()]):
-    app.state.loaded_news = app.state.news_loader.get_news(news_filter)
-    return {"news": app.state.loaded_news, "n_filter": news_filter}
+    client = request.client.host if request.client else "anonymous"
+    with profiler.maybe_profile(request, "feed"):
+        news, source = [], "index"
+        # the index only holds the locales, languages and categories ingested
+        if app.state.ingest is not None and app.state.ingest.covers(news_filter):
+            news = app.state.article_index.get_news(news_filter)
+        if not news:
+            # not indexed (yet), ask TheNewsAPI
+            source = "live"
+            news = await app.state.news_loader.get_news(news_filter)
+            app.state.prefetcher.after(news_filter, client)
+        metrics.FEED_PAGES.inc(source=source)
+        app.state.loaded_news = news
+    # near-duplicates of one story, as indices into news
+    clusters = app.state.orca.clusters.groups(app.state.loaded_news)
+    app.state.presummarizer.after_feed(app.state.loaded_news, client)
+    return {
+        "news": app.state.loaded_news,
+        "n_filter": news_filter,
+        "clusters": clusters,
+        "source": source,
+    }
 
 
 @app.post("/api/generate")
@@ -48,11 +149,29 @@ async def generate(
     request: Request,
     article: Annotated[int, Body()],
     platform: Annotated[str, Body()],
+    stream: Annotated[bool, Body()] = False,
+    mode: Annotated[
+        Literal["sequential", "parallel", "batched"], Body()
+    ] = "sequential",
+    overgenerate: Annotated[int, Body(ge=0, le=5)] = 0,
+    timings: Annotated[bool, Body()] = False,
 ):
+    if app.state.orca.models.scheduler.overloaded():
+        scheduler.REJECTIONS.inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Too many generations queued, try again shortly",
+            headers={"Retry-After": "5"},
+        )
     style = Style.model_validate_json(await request.body())
-    nest_asyncio.apply(asyncio.get_event_loop())
     article = app.state.loaded_news[article]
+    client = request.client.host if request.client else "anonymous"
+    events = app.state.orca.generate(
+        article, style, platform, stream, mode, overgenerate, timings, client
+    )
+    if profiler.authorized(request):
+        events = profiler.profile_events(events, "generate")
     return JSONStreamingResponse(
-        app.state.orca.generate(article, style, platform),
+        events,
         media_type="text/event-stream",
     )
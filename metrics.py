@@ -0,0 +1,152 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_timings = ContextVar("timings", default=None)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in values
+    )
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def lines(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        series = self.values.get(key)
+        if series is None:
+            # per bucket counts (the last one is +Inf), sum, count
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def lines(self):
+        names = self.labels + ("le",)
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket
+                labels = _labels(names, key + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {count}"
+
+
+class Metrics:
+    """In-process metrics rendered in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._metrics = {}
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Metrics()
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_seconds", "Duration of a generation pipeline stage.", ("stage",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens used by model calls.", ("stage", "kind")
+)
+JSON_REPAIRS = REGISTRY.counter(
+    "json_repairs_total",
+    "Structured outputs that failed validation and went through return_modeled.",
+    ("schema",),
+)
+RETRIES = REGISTRY.counter(
+    "retries_total", "Pipeline steps retried or redone another way.", ("stage",)
+)
+PRESUMMARIES = REGISTRY.counter(
+    "presummaries_total",
+    "Articles summarized ahead of a generation, and what became of them.",
+    ("outcome",),
+)
+FEED_PAGES = REGISTRY.counter(
+    "feed_pages_total",
+    "Feed pages served, by where they came from: index or live.",
+    ("source",),
+)
+SUMMARY_REUSES = REGISTRY.counter(
+    "summary_cluster_reuses_total",
+    "Generations that reused the summary of a near-duplicate article.",
+)
+
+
+def track_request():
+    """Collect the stage timings of the current request into the returned dict."""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0) + seconds, 4)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def record_tokens(stage, prompt_tokens, completion_tokens):
+    LLM_TOKENS.inc(prompt_tokens, stage=stage, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, stage=stage, kind="completion")
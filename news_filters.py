@@ -119,6 +119,7 @@ class NewsFilter(Option):
     locale: list[LocaleChoice] = None
     language: list[LanguageChoice] = None
     categories: list[CategoryChoice] = None
+    search: Optional[str] = None
     published_before: Optional[NaiveDatetime] = None
     published_after: Optional[NaiveDatetime] = None
     published_on: Optional[NaiveDatetime] = None
@@ -128,4 +129,6 @@ class NewsFilter(Option):
 
     @field_serializer("locale", "language", "categories")
     def ser_enums(self, field_value, _info):
-        return [val.name for val in field_value if field_value is not None]
+        if field_value is None:
+            return None
+        return [val.name for val in field_value]
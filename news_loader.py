@@ -1,13 +1,70 @@
-import requests
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict
 
-from news_filters import NewsFilter
+import httpx
+import metrics
+from news_filters import LanguageChoice, LocaleChoice, NewsFilter
+from singleflight import SingleFlight
+
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://api.thenewsapi.com/v1/news/")
+NEWS_CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", 300))
+# upstream calls per second spent on prefetching neighbouring pages, 0 disables
+NEWS_PREFETCH_RATE = float(os.getenv("NEWS_PREFETCH_RATE", 1))
+
+PREFETCHES = metrics.REGISTRY.counter(
+    "news_prefetches_total",
+    "Feed pages prefetched, and what became of them.",
+    ("outcome",),
+)
 
 
 class NewsLoader:
-    def __init__(self, news_filter: NewsFilter = NewsFilter()) -> None:
-        news_filter.locale = "us"
-        news_filter.language = "en"
-        self.news_filter = news_filter
+    """TheNewsAPI pages over a keep-alive pool, cached for `ttl` seconds.
+
+    Pages are keyed by the normalized filter, so paging back and forth or
+    several users on the same feed cost one upstream call per page and ttl.
+    Concurrent misses on the same page share one call.
+    """
+
+    def __init__(
+        self,
+        news_filter: NewsFilter = NewsFilter(),
+        ttl: float = NEWS_CACHE_TTL,
+        max_entries: int = 256,
+        timeout: float = 15,
+    ) -> None:
+        # the default for get_news(), the caller's filter is left as it is
+        self.news_filter = news_filter.model_copy(
+            update={"locale": [LocaleChoice.us], "language": [LanguageChoice.en]}
+        )
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.prefetches = 0
+        self.prefetch_hits = 0
+        # cached pages nobody has asked for yet
+        self._prefetched = set()
+        self._pages: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._flights = SingleFlight()
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                auth=("api_token", ""),
+                timeout=httpx.Timeout(self.timeout, connect=5),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            )
+        return self._client
 
     def _apply_filters(self):
         pass
@@ -15,30 +72,229 @@ class NewsLoader:
     def _update_filter(self):
         pass
 
-    def _get_page(self):
-        pass
+    @staticmethod
+    def cache_key(news_filter: NewsFilter):
+        # count is filled in from the response, the rest selects the page
+        params = news_filter.model_dump(
+            mode="json", exclude={"count"}, exclude_defaults=True
+        )
+        for name, value in params.items():
+            if isinstance(value, list):
+                params[name] = sorted(value)
+        return json.dumps(params, sort_keys=True)
 
-    def get_news(self, news_filter: NewsFilter = None):
-        if news_filter is not None:
-            self.news_filter = news_filter
-        if self.news_filter.page > 19999:
-            raise ValueError("Page Limit Reached")
+    @staticmethod
+    def _params(news_filter: NewsFilter):
+        params = news_filter.model_dump(
+            mode="json",
+            exclude={"top", "count"},
+            exclude_defaults=True,
+            exclude_unset=True,
+        )
+        for name, value in params.items():
+            if isinstance(value, list):
+                params[name] = ",".join(value)
+        return params
+
+    def _cached(self, key):
+        entry = self._pages.get(key)
+        if entry is not None and time.time() - entry[0] > self.ttl:
+            del self._pages[key]
+            self._prefetched.discard(key)
+            entry = None
+        if entry is None:
+            return None
+        self._pages.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key, page):
+        self._pages[key] = (time.time(), page)
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_entries:
+            evicted, _ = self._pages.popitem(last=False)
+            self._prefetched.discard(evicted)
+
+    async def request_page(self, news_filter: NewsFilter):
+        """One uncached upstream call for the filter's page."""
+        url = NEWS_API_URL + ("top" if news_filter.top else "all")
+        start = time.perf_counter()
+        response = await self.client.get(url, params=self._params(news_filter))
+        elapsed = time.perf_counter() - start
+        self.upstream_calls += 1
+        self.upstream_seconds += elapsed
+        metrics.observe_stage("news_api", elapsed)
+        return response.json()
+
+    async def _fetch(self, key, news_filter: NewsFilter):
+        page = await self.request_page(news_filter)
+        if "error" not in page:
+            self._store(key, page)
+        return page
+
+    async def _get_page(self, news_filter: NewsFilter):
+        key = self.cache_key(news_filter)
+        page = self._cached(key)
+        if page is not None:
+            self.hits += 1
+            if key in self._prefetched:
+                self._prefetched.discard(key)
+                self.prefetch_hits += 1
+                PREFETCHES.inc(outcome="used")
+            return page
+        self.misses += 1
+        return await self._flights.do(key, self._fetch, key, news_filter.model_copy())
+
+    async def prefetch(self, news_filter: NewsFilter):
+        """Fetch a page into the cache without counting it as a lookup."""
+        key = self.cache_key(news_filter)
+        if self._cached(key) is not None or self._flights.in_flight(key):
+            return
+        page = await self._flights.do(key, self._fetch, key, news_filter.model_copy())
+        if "error" not in page:
+            self._prefetched.add(key)
+            self.prefetches += 1
+            PREFETCHES.inc(outcome="fetched")
 
-        url = "https://api.thenewsapi.com/v1/news/"
-        url += "top" if news_filter.top else "all"
+    def last_page(self, news_filter: NewsFilter):
+        """The filter's last page according to its cached response, if any."""
+        entry = self._pages.get(self.cache_key(news_filter))
+        if entry is None:
+            return None
+        meta = entry[1]["meta"]
+        return math.ceil(meta["found"] / meta["limit"]) if meta["limit"] else None
 
-        param_dump = news_filter.model_dump(exclude_defaults=True, exclude_unset=True)
+    async def get_news(self, news_filter: NewsFilter = None):
+        # concurrent requests each fill in the count of their own filter
+        if news_filter is None:
+            news_filter = self.news_filter.model_copy()
+        if news_filter.page > 19999:
+            raise ValueError("Page Limit Reached")
 
-        fetch = requests.get(
-            "https://api.thenewsapi.com/v1/news/all",
-            auth=("api_token", ""),
-            params=param_dump,
-        ).json()
+        fetch = await self._get_page(news_filter)
 
         if "error" in fetch:
             return []
-    
+
         f_data = fetch["meta"]
-        self.news_filter.count = f_data["found"]
-        f_news = fetch["data"]
+        news_filter.count = f_data["found"]
+        # generation writes into the articles it is given, the cache keeps its own
+        f_news = [dict(article) for article in fetch["data"]]
         return f_news
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        calls = self.upstream_calls
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._pages),
+            "upstream_calls": calls,
+            "upstream_avg_s": self.upstream_seconds / calls if calls else 0.0,
+            "prefetched": self.prefetches,
+            "prefetches_used": self.prefetch_hits,
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class PagePrefetcher:
+    """Fetches the neighbours of the page just served into a NewsLoader cache.
+
+    After page N of a feed, pages N+1..N+`ahead` and N-1..N-`behind` are fetched
+    in the background, spending at most `rate` upstream calls per second with
+    bursts of `burst`. Prefetches that would wait longer than `max_wait` for
+    budget are skipped. Prefetches still waiting are cancelled when the client
+    moves to another filter; a call already sent finishes into the cache.
+    """
+
+    def __init__(
+        self,
+        loader: NewsLoader,
+        ahead=1,
+        behind=0,
+        rate=NEWS_PREFETCH_RATE,
+        burst=2,
+        max_wait=5.0,
+    ) -> None:
+        self.loader = loader
+        self.ahead = ahead
+        self.behind = behind
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        # client -> (feed key, page key -> prefetch task)
+        self._clients: dict[str, tuple[str, dict[str, asyncio.Task]]] = {}
+
+    def _reserve(self):
+        """Seconds until a reserved upstream call may go out, None if over budget."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled) * self.rate
+        )
+        self._refilled = now
+        wait = max(0.0, (1 - self._tokens) / self.rate)
+        if wait > self.max_wait:
+            return None
+        self._tokens -= 1
+        return wait
+
+    async def _prefetch(self, news_filter: NewsFilter, wait):
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # the reserved call never went out
+            self._tokens += 1
+            PREFETCHES.inc(outcome="cancelled")
+            raise
+        try:
+            await self.loader.prefetch(news_filter)
+        except Exception as e:
+            print("page prefetch failed", news_filter.page, e)
+            PREFETCHES.inc(outcome="failed")
+
+    def after(self, news_filter: NewsFilter, client="anonymous"):
+        """Schedule the neighbours of the page just served to `client`."""
+        if self.rate <= 0:
+            return
+        feed = self.loader.cache_key(news_filter.model_copy(update={"page": 1}))
+        previous, tasks = self._clients.get(client, (None, {}))
+        if previous != feed:
+            for task in tasks.values():
+                task.cancel()
+            tasks = {}
+        tasks = {key: task for key, task in tasks.items() if not task.done()}
+        # forget clients with nothing left to cancel
+        self._clients = {
+            other: entry
+            for other, entry in self._clients.items()
+            if not all(task.done() for task in entry[1].values())
+        }
+        self._clients[client] = (feed, tasks)
+
+        last = self.loader.last_page(news_filter) or 19999
+        pages = [news_filter.page + n for n in range(1, self.ahead + 1)]
+        pages += [news_filter.page - n for n in range(1, self.behind + 1)]
+        for page in pages:
+            if not 1 <= page <= min(last, 19999):
+                continue
+            neighbour = news_filter.model_copy(update={"page": page})
+            key = self.loader.cache_key(neighbour)
+            if key in tasks or self.loader._cached(key) is not None:
+                continue
+            wait = self._reserve()
+            if wait is None:
+                PREFETCHES.inc(outcome="skipped")
+                continue
+            tasks[key] = asyncio.ensure_future(self._prefetch(neighbour, wait))
+
+    def close(self):
+        for _, tasks in self._clients.values():
+            for task in tasks.values():
+                task.cancel()
+        self._clients.clear()
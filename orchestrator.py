@@ -1,29 +1,61 @@
+import asyncio
 import re
+import time
 
-import requests
-from bs4 import BeautifulSoup
-from outlines import generate
-from posts import Platforms, Post, post_text
+import metrics
+import scheduler
+from article_cache import ArticleCache
+from budget import TokenBudget
+from extraction import extract_main_content
+from fetcher import ArticleFetcher
+from llm_registry import ModelRegistry
+from posts import Platforms, Post, Posts, batched_post_text, post_text
 from pydantic_core import ValidationError
+from similarity import StoryClusters, jaccard, shingles
+from singleflight import SingleFlight
+from starlette.concurrency import run_in_threadpool
 from styles import Style, Styles, style_selection
-from summary import Summaries, chain_of_density
-from utils import get_model, return_modeled
+from streaming_json import ItemFeed
+from summary import Summaries, Summary, chain_of_density, chunk_summary
+from summary_store import SummaryStore
+from utils import MODEL_NAME, return_modeled
+
+POST_COUNT = 5
 
 
 class Orchestrator:
-    article = {"uuid": ""}
+    duplicate_threshold = 0.6
+    # how often a waiting generation reports its place in the model call queue
+    queue_poll = 0.5
 
-    def _get_article_body(self, url):
-        org_article = requests.get(
-            url,
-            allow_redirects=True,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:131.0) Gecko/20100101 Firefox/131.0",
-                "X-Requested-With": "XMLHTTPSRequest",
-            },
-            timeout=15,
+    def __init__(
+        self,
+        fetcher: ArticleFetcher = None,
+        article_cache: ArticleCache = None,
+        summaries: SummaryStore = None,
+        models: ModelRegistry = None,
+        budget: TokenBudget = None,
+        clusters: StoryClusters = None,
+    ) -> None:
+        self.fetcher = fetcher or ArticleFetcher()
+        self.article_cache = article_cache or ArticleCache()
+        self.summaries = summaries or SummaryStore()
+        self.flights = SingleFlight()
+        self.models = models or ModelRegistry()
+        self.budget = budget or TokenBudget()
+        self.clusters = clusters or StoryClusters()
+        # summary key -> pre-summarization running in the background
+        self._presummarizing: dict[str, scheduler.Background] = {}
+        # summary keys pre-summarized that no generation has used yet
+        self._presummarized: dict[str, None] = {}
+
+    def _clean_body(self, html):
+        extraction = extract_main_content(html)
+        print(
+            f"extracted {extraction.kept_chars} chars, "
+            f"removed {extraction.removed_chars} of boilerplate"
         )
-        art_body = BeautifulSoup(org_article.text, "html.parser").get_text()
+        art_body = extraction.text
 
         return (
             re.sub(r"\s+", " ", art_body.lower())
@@ -32,26 +64,94 @@ class Orchestrator:
             .replace('"', "'")
         )
 
-    def _summarize(self, article):
-        article["body"] = self._get_article_body(article["url"])
+    async def _get_article_body(self, url):
+        cached = self.article_cache.get(url)
+        if cached is not None and self.article_cache.is_fresh(cached):
+            return self.article_cache.hit(url, cached)
+
+        with metrics.stage("fetch"):
+            org_article = await self.fetcher.fetch(
+                url, headers=self.article_cache.validators(cached)
+            )
+        if org_article.status == 304 and cached is not None:
+            return self.article_cache.hit(url, cached, revalidated=True)
+
+        # html parsing is cpu-bound, keep it off the event loop
+        with metrics.stage("extract"):
+            body = await run_in_threadpool(self._clean_body, org_article.text)
+        return self.article_cache.store(
+            url,
+            body,
+            org_article.headers,
+            cacheable=org_article.status == 200 and not org_article.truncated,
+        )
+
+    async def _summarize(self, article):
+        article["body"] = await self._get_article_body(article["url"])
         prompt = chain_of_density(article)
+        # long articles are condensed chunk by chunk until the density pass fits
+        while not self.budget.fits(prompt):
+            condensed = await self._condense(article)
+            if len(condensed) >= len(article["body"]):
+                break
+            article["body"] = condensed
+            prompt = chain_of_density(article)
+        return await self._run_summary(prompt)
+
+    async def _condense(self, article):
+        overhead = self.budget.count(chunk_summary(article, "", 0, 0))
+        # smaller chunks than the window allows, so they summarize concurrently
+        size = min(self.budget.chunk_tokens, self.budget.prompt_tokens - overhead)
+        chunks = self.budget.chunks(article["body"], size)
+        print(f"condensing article in {len(chunks)} chunks")
+        generator = self.models.text(0.3, max_tokens=300)
+        with metrics.stage("condense"):
+            summaries = await asyncio.gather(
+                *(
+                    self.models.complete(
+                        generator,
+                        chunk_summary(article, chunk, idx + 1, len(chunks)),
+                        stage="condense",
+                    )
+                    for idx, chunk in enumerate(chunks)
+                )
+            )
+        return " ".join(summaries)
+
+    async def _run_summary(self, prompt):
         try:
-            generator = generate.json(get_model(), Summaries)
-            summaries = generator(prompt)
+            # the budget reserved this much of the context for the answer
+            generator = self.models.json(
+                Summaries, max_tokens=self.budget.completion_tokens
+            )
+            with metrics.stage("summarize"):
+                summaries = [
+                    summary
+                    async for summary in self.models.stream_items(
+                        generator, prompt, Summary, "summaries", stage="summarize"
+                    )
+                ]
         except ValidationError as e:
-            summaries = return_modeled(Summaries, e.errors())
+            summaries = return_modeled(Summaries, e.errors()).summaries
         print("summed up")
-        return "\n".join([summary.Denser_Summary for summary in summaries.summaries])
+        return "\n".join([summary.Denser_Summary for summary in summaries[:5]])
 
-    def _style(self, prompt):
+    async def _style(self, prompt):
         try:
-            style_selector = generate.json(get_model(0.8), Styles)
-            return style_selector(prompt)
+            style_selector = self.models.json(Styles, 0.8)
+            with metrics.stage("styles"):
+                async for style in self.models.stream_items(
+                    style_selector, prompt, Style, "styles", stage="styles"
+                ):
+                    print("style", style)
+                    yield style
         except ValidationError as e:
             print("style error, trying to model")
-            return return_modeled(Styles, e.errors())
+            for style in return_modeled(Styles, e.errors()).styles:
+                yield style
 
-    def _get_styles(self, summaries, cons_style: Style):
+    def _get_styles(self, summaries, cons_style: Style) -> ItemFeed:
+        """Styles to write the posts in, readable while the model is still choosing."""
         print("recieved style: ", cons_style)
         styles = Style.get_options()
         if cons_style is not None:
@@ -63,28 +163,55 @@ class Orchestrator:
             print("determining style options")
             prompt = style_selection(summaries, {**styles})
             print("\nStyle prompt", prompt, "\n")
-            return self._style(prompt)
-        return Styles(styles=[cons_style])
+            return self.flights.feed(("styles", prompt), self._style, prompt)
+        return ItemFeed.of([cons_style])
 
-    def _gen_post_text(self, prompt):
+    async def _gen_post_text(self, prompt, retries=1):
         try:
-            post_generator = generate.text(get_model(1.6))
-            text = post_generator(prompt)
+            post_generator = self.models.text(1.6)
+            with metrics.stage("post"):
+                text = await self.models.complete(post_generator, prompt, stage="post")
             print("generated post")
             return text
         except Exception as e:
             print("error while gen post", e)
-            return self._gen_post(prompt)
+            if not retries:
+                raise
+            metrics.RETRIES.inc(stage="post")
+            return await self._gen_post_text(prompt, retries - 1)
+
+    async def _stream_post_text(self, prompt, idx, parts: list[str]):
+        start = time.perf_counter()
+        try:
+            post_generator = self.models.text(1.6)
+            async for delta in self.models.stream(post_generator, prompt, stage="post"):
+                parts.append(delta)
+                yield {"event": "post_delta", "data": {"index": idx, "delta": delta}}
+            # includes the time the client took to consume the deltas
+            metrics.observe_stage("post", time.perf_counter() - start)
+            print("generated post")
+        except Exception as e:
+            # the final post_created replaces whatever deltas were already sent
+            print("error while streaming post", e)
+            metrics.RETRIES.inc(stage="post_stream")
+            parts[:] = [await self._gen_post_text(prompt)]
 
-    def _write_posts(self, article, target: Platforms, styles: Styles):
+    async def _write_posts(
+        self, article, target: Platforms, styles: ItemFeed, stream=False
+    ):
         posts = []
-        for idx in range(5):
-            style = (
-                styles.styles[idx] if len(styles.styles) > idx else styles.styles[-1]
-            )
+        for idx in range(POST_COUNT):
+            # the first post is written as soon as the first style is chosen
+            style = await styles.get(idx) or styles.items[-1]
             prompt = post_text(article, posts, target.post_model, style.get_enums())
             print("\nPost prompt", prompt, "\n")
-            text = self._gen_post_text(prompt)
+            if stream:
+                parts = []
+                async for event in self._stream_post_text(prompt, idx, parts):
+                    yield event
+                text = "".join(parts)
+            else:
+                text = await self._gen_post_text(prompt)
 
             post = {
                 "text": text,
@@ -92,27 +219,208 @@ class Orchestrator:
             }
             post = Post(**post)
             posts.append(post)
-            yield post
+            yield {
+                "event": "post_created",
+                "data": {"index": idx, "post": post.model_dump_json()},
+            }
+
+    async def _write_posts_parallel(
+        self, article, target: Platforms, styles: ItemFeed, overgenerate=0
+    ):
+        async def write(idx):
+            style = await styles.get(idx) or styles.items[idx % len(styles.items)]
+            # no GENERATED_POSTS in the prompt, diversity is checked afterwards
+            prompt = post_text(article, [], target.post_model, style.get_enums())
+            return Post(text=await self._gen_post_text(prompt), style=style)
+
+        tasks = [
+            asyncio.ensure_future(write(idx))
+            for idx in range(POST_COUNT + overgenerate)
+        ]
+        kept = []
+        try:
+            for next_post in asyncio.as_completed(tasks):
+                try:
+                    post = await next_post
+                except Exception as e:
+                    print("error while gen post", e)
+                    continue
+                post_shingles = shingles(post.text)
+                if any(
+                    jaccard(post_shingles, other) >= self.duplicate_threshold
+                    for other in kept
+                ):
+                    print("dropped near-duplicate post")
+                    continue
+                kept.append(post_shingles)
+                yield {
+                    "event": "post_created",
+                    "data": {"index": len(kept) - 1, "post": post.model_dump_json()},
+                }
+                if len(kept) == POST_COUNT:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
 
-    def generate(self, article, style: Style, target: str):
+    async def _write_posts_batched(self, article, target: Platforms, styles: ItemFeed):
+        styles = await styles.all()
+        post_styles = [styles[idx % len(styles)] for idx in range(POST_COUNT)]
+        prompt = batched_post_text(
+            article, target.post_model, [style.get_enums() for style in post_styles]
+        )
+        print("\nBatched post prompt", prompt, "\n")
+        try:
+            with metrics.stage("posts_batched"):
+                batch = await self.models.complete(
+                    self.models.json(Posts, 1.2), prompt, stage="posts_batched"
+                )
+        except ValidationError as e:
+            try:
+                batch = return_modeled(Posts, e.errors())
+            except Exception as e:
+                print("batched posts unusable, writing them one by one", e)
+                batch = None
+        entries = batch.posts if batch is not None else []
+
+        posts = []
+        for idx, style in enumerate(post_styles):
+            post = None
+            if idx < len(entries):
+                try:
+                    post = type(target.post_model)(text=entries[idx].text, style=style)
+                except ValidationError as e:
+                    print("batched post failed validation, regenerating", e)
+            if post is None:
+                metrics.RETRIES.inc(stage="posts_batched")
+                prompt = post_text(article, posts, target.post_model, style.get_enums())
+                post = Post(text=await self._gen_post_text(prompt), style=style)
+            posts.append(post)
+            yield {
+                "event": "post_created",
+                "data": {"index": idx, "post": post.model_dump_json()},
+            }
+
+    async def _read_article(self, article, summary_key):
+        article = dict(article)
+        article["body"] = await self._summarize(article)
+        self.summaries.set(summary_key, article)
+        return article
+
+    def summary_key(self, article):
+        # near-duplicate articles share one summary, stored under their cluster
+        cluster = self.clusters.add([article])[0]
+        return self.summaries.key(cluster, MODEL_NAME, chain_of_density)
+
+    async def presummarize(self, article):
+        """Summarize an article before anyone asks, with background model calls.
+
+        Returns False when it is already summarized or being summarized.
+        """
+        summary_key = self.summary_key(article)
+        flight = ("summary", summary_key)
+        if summary_key in self.summaries or self.flights.in_flight(flight):
+            return False
+        background = scheduler.run_in_background()
+        self._presummarizing[summary_key] = background
+        try:
+            await self.flights.do(flight, self._read_article, article, summary_key)
+        except asyncio.CancelledError:
+            abandoned = self.flights.abandon(flight)
+            if abandoned is not None:
+                # let it unwind before our caller closes anything it uses
+                await asyncio.wait({abandoned})
+            raise
+        finally:
+            del self._presummarizing[summary_key]
+        if background.active:
+            self._presummarized[summary_key] = None
+            while len(self._presummarized) > self.summaries.max_entries:
+                del self._presummarized[next(iter(self._presummarized))]
+        return True
+
+    def _used_presummary(self, summary_key):
+        if summary_key in self._presummarized:
+            del self._presummarized[summary_key]
+            metrics.PRESUMMARIES.inc(outcome="used")
+
+    async def generate(
+        self,
+        article,
+        style: Style,
+        target: str,
+        stream=False,
+        mode="sequential",
+        overgenerate=0,
+        timings=False,
+        client="anonymous",
+    ):
+        start = time.perf_counter()
+        request_timings = metrics.track_request() if timings else None
+        scheduler.set_client(client)
+        events = self._generate(article, style, target, stream, mode, overgenerate)
+        next_event = asyncio.ensure_future(anext(events))
+        position = 0
+        try:
+            while True:
+                done, _ = await asyncio.wait({next_event}, timeout=self.queue_poll)
+                if not done:
+                    # still waiting, say so if our model calls are queued
+                    queued = self.models.scheduler.position(client)
+                    if queued and queued != position:
+                        yield {"event": "queued", "data": {"position": queued}}
+                    position = queued
+                    continue
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    break
+                next_event = asyncio.ensure_future(anext(events))
+                if timings:
+                    event["elapsed_s"] = round(time.perf_counter() - start, 4)
+                yield event
+        finally:
+            next_event.cancel()
+        metrics.observe_stage("generate", time.perf_counter() - start)
+        if timings:
+            yield {"event": "timings", "data": request_timings}
+
+    async def _generate(
+        self, article, style: Style, target: str, stream, mode, overgenerate
+    ):
         print("generating")
         target = Platforms(name=target)
         print("platform", target)
 
-        if self.article["uuid"] == article["uuid"]:
-            article = self.article
+        summary_key = self.summary_key(article)
+        summarized = self.summaries.get(summary_key)
+        if summarized is not None:
+            self._used_presummary(summary_key)
         else:
             yield {"event": "reading_article"}
-            article["body"] = self._summarize(article)
-            self.article = article
+            presummarizing = self._presummarizing.get(summary_key)
+            if presummarizing is not None and presummarizing.active:
+                # somebody is waiting for it now, stop yielding to other calls
+                presummarizing.promote()
+                metrics.PRESUMMARIES.inc(outcome="used")
+            # concurrent requests for the same story share one fetch and summary
+            summarized = await self.flights.do(
+                ("summary", summary_key), self._read_article, article, summary_key
+            )
+        if summarized["uuid"] != article["uuid"]:
+            print("reusing the summary of near-duplicate", summarized["uuid"])
+            metrics.SUMMARY_REUSES.inc()
+        article = {**article, "body": summarized["body"]}
 
         yield {"event": "determining_styles"}
         styles = self._get_styles(article, style)
-        print(styles)
         yield {"event": "writing_posts"}
 
-        for post in self._write_posts(article, target, styles):
-            yield {
-                "event": "post_created",
-                "data": {"post": post.model_dump_json()},
-            }
+        if mode == "parallel":
+            posts = self._write_posts_parallel(article, target, styles, overgenerate)
+        elif mode == "batched":
+            posts = self._write_posts_batched(article, target, styles)
+        else:
+            posts = self._write_posts(article, target, styles, stream)
+        async for event in posts:
+            yield event
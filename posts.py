@@ -2,6 +2,7 @@ from typing import Any, Literal
 
 from outlines import prompt
 from pydantic import BaseModel, StringConstraints, field_serializer, model_validator
+from pydantic.types import conlist
 from styles import Style
 from typing_extensions import Annotated
 
@@ -66,6 +67,14 @@ class Platforms(BaseModel):
         return post_instance
 
 
+class PostText(BaseModel):
+    text: str
+
+
+class Posts(BaseModel):
+    posts: conlist(PostText, min_length=1, max_length=10)  # type: ignore
+
+
 @prompt
 def post_text(article, posts, platform, style):
     """\
@@ -100,3 +109,39 @@ def post_text(article, posts, platform, style):
     # OUTPUT #
        A response that only contains the entire post content body.
     """
+
+
+@prompt
+def batched_post_text(article, platform, styles):
+    """\
+    # CONTEXT #\
+
+    ARTICLE:
+        TITLE: {{ article.title }}
+        DESCRIPTION: {{ article.description }}
+        SUMMARY: {{ article.body }}
+
+    # OBJECTIVE #\
+
+    Generate {{ styles|length }} different social media posts that comment on the article you just read.
+    Tailor every post to {{ platform.kind }} and do not repeat content between posts.
+
+    # STYLE #\
+
+    {% for style in styles %}
+    - Post {{ loop.index }} should be generated using the following criteria:
+        {% for key, value in style.items() %}
+            {% if value %}
+        - Stick to the following {{ key }} when writing:  {{ value }}.
+            {% endif %}
+        {% endfor %}
+    {% endfor %}
+    - Every post should be tailored towards this platform: {{ platform.kind }}.
+    - Write at least {{ platform.min }} characters per post.
+    - Limit every post to {{ platform.max }} characters.
+    - Use {{ platform.allowed_specials }} strategically to make the post content more appealing and expressive.
+
+    # OUTPUT #
+    Respond only with a JSON containing a single "posts" key.
+    Format your response as a list of {{ styles|length }} dictionaries, in the order above, each with a single "text" key holding the entire post content body.
+    """
@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+import metrics
+import scheduler
+from orchestrator import Orchestrator
+
+# articles at the top of each feed page to summarize ahead of a click, 0 disables
+PRESUMMARIZE_TOP_K = int(os.getenv("PRESUMMARIZE_TOP_K", 0))
+
+
+class PreSummarizer:
+    """Summarizes the top articles of a feed before anyone generates for them.
+
+    After a feed page is served its first `top_k` articles are summarized,
+    `concurrency` at a time, with model calls at the scheduler's background
+    priority so they only use slots nothing else wants. Articles beyond
+    `max_queue` waiting ones are skipped, and a client's warm-ups for articles
+    that are not in its latest feed page are cancelled.
+    """
+
+    def __init__(
+        self, orca: Orchestrator, top_k=PRESUMMARIZE_TOP_K, max_queue=8, concurrency=1
+    ) -> None:
+        self.orca = orca
+        self.top_k = top_k
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+        self._limit = None
+        # client -> article uuid -> warm-up task
+        self._clients: dict[str, dict[str, asyncio.Task]] = {}
+
+    async def _warm(self, article, client):
+        scheduler.set_client(client)
+        try:
+            async with self._limit:
+                if await self.orca.presummarize(article):
+                    metrics.PRESUMMARIES.inc(outcome="done")
+        except Exception as e:
+            print("pre-summarization failed", article["uuid"], e)
+            metrics.PRESUMMARIES.inc(outcome="failed")
+
+    def _finished(self, task: asyncio.Task):
+        # also called for warm-ups cancelled before they started
+        if task.cancelled():
+            metrics.PRESUMMARIES.inc(outcome="cancelled")
+
+    @property
+    def pending(self):
+        return sum(
+            not task.done()
+            for tasks in self._clients.values()
+            for task in tasks.values()
+        )
+
+    def after_feed(self, articles: list[dict], client="anonymous"):
+        """Queue the top articles of the feed page just served to `client`."""
+        if self.top_k <= 0:
+            return
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.concurrency)
+        top = {article["uuid"]: article for article in articles[: self.top_k]}
+        tasks = self._clients.get(client, {})
+        for uuid, task in tasks.items():
+            if uuid not in top:
+                task.cancel()
+        tasks = {
+            uuid: task
+            for uuid, task in tasks.items()
+            if uuid in top and not task.done()
+        }
+        # forget clients with nothing left to cancel
+        self._clients = {
+            other: others
+            for other, others in self._clients.items()
+            if other != client and not all(task.done() for task in others.values())
+        }
+        self._clients[client] = tasks
+        for uuid, article in top.items():
+            if uuid in tasks:
+                continue
+            if self.pending >= self.max_queue:
+                metrics.PRESUMMARIES.inc(outcome="skipped")
+                continue
+            tasks[uuid] = asyncio.ensure_future(self._warm(article, client))
+            tasks[uuid].add_done_callback(self._finished)
+
+    def stats(self):
+        return {
+            "top_k": self.top_k,
+            "pending": self.pending,
+            **{
+                labels[0]: count
+                for labels, count in metrics.PRESUMMARIES.values.items()
+            },
+        }
+
+    async def aclose(self):
+        tasks = [task for tasks in self._clients.values() for task in tasks.values()]
+        self._clients.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
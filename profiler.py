@@ -0,0 +1,194 @@
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+# sent as X-Profile or ?profile= to profile a request, unset disables profiling
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# profiles kept on disk, the oldest are deleted first
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))
+WORKER_PREFIX = "AnyIO worker"
+
+
+def authorized(request):
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    if not PROFILE_TOKEN or flag is None:
+        return False
+    return hmac.compare_digest(flag.encode(), PROFILE_TOKEN.encode())
+
+
+def _thread_cpu(ident):
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        # not available on this platform, or the thread already exited
+        return None
+
+
+def _idle(frame):
+    code = frame.f_code
+    return code.co_name == "wait" and code.co_filename.endswith("threading.py")
+
+
+class Profiler:
+    """Sampling profiler for one request, written as folded stacks.
+
+    A background thread samples the stacks of the event loop thread and of the
+    threadpool workers every `interval` seconds. Each stack is weighted twice:
+    by samples (wall time, including time the loop sat waiting on the model or
+    the network) and by the CPU time the sampled thread used since its previous
+    sample. Everything running on those threads is sampled, so concurrent
+    requests show up in the profile too.
+    """
+
+    def __init__(
+        self, name, interval=0.005, directory=PROFILE_DIR, keep=PROFILE_KEEP
+    ) -> None:
+        self.name = name
+        self.interval = interval
+        self.directory = directory
+        self.keep = keep
+        self.wall = Counter()
+        self.cpu = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # must be called from the event loop thread
+        self._loop_ident = threading.get_ident()
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        self._thread = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def _stack(self, thread, frame):
+        names = []
+        while frame is not None and len(names) < 128:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        names.append("loop" if thread == self._loop_ident else "worker")
+        return ";".join(reversed(names))
+
+    def _run(self):
+        last_cpu = {self._loop_ident: _thread_cpu(self._loop_ident)}
+        while not self._stop.wait(self.interval):
+            workers = {
+                thread.ident
+                for thread in threading.enumerate()
+                if thread.name.startswith(WORKER_PREFIX)
+            }
+            for ident, frame in sys._current_frames().items():
+                if ident != self._loop_ident and ident not in workers:
+                    continue
+                cpu = _thread_cpu(ident)
+                previous = last_cpu.get(ident)
+                used = 0 if cpu is None or previous is None else cpu - previous
+                last_cpu[ident] = cpu
+                if ident != self._loop_ident and _idle(frame):
+                    continue
+                stack = self._stack(ident, frame)
+                self.wall[stack] += 1
+                self.cpu[stack] += int(used * 1_000_000)
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        wall = time.perf_counter() - self._started
+        cpu = time.process_time() - self._cpu_started
+        return self.save(wall, cpu)
+
+    def save(self, wall, cpu):
+        os.makedirs(self.directory, exist_ok=True)
+        stem = os.path.join(
+            self.directory, time.strftime("%Y%m%d-%H%M%S-") + f"{self.name}-{id(self)}"
+        )
+        for kind, counts in (("wall", self.wall), ("cpu", self.cpu)):
+            with open(f"{stem}.{kind}.folded", "w") as f:
+                for stack, count in counts.most_common():
+                    if count:
+                        f.write(f"{stack} {count}\n")
+        summary = {
+            "name": self.name,
+            "wall_s": round(wall, 4),
+            "process_cpu_s": round(cpu, 4),
+            "sampled_cpu_s": round(sum(self.cpu.values()) / 1_000_000, 4),
+            "samples": self.samples,
+            "interval_s": self.interval,
+            "files": [f"{os.path.basename(stem)}.{k}.folded" for k in ("wall", "cpu")],
+        }
+        with open(f"{stem}.json", "w") as f:
+            json.dump(summary, f)
+        print(
+            f"profiled {self.name}: {summary['wall_s']}s wall, "
+            f"{summary['sampled_cpu_s']}s cpu, written to {stem}.*.folded"
+        )
+        prune(self.keep, self.directory)
+        return summary
+
+
+def prune(keep, directory=PROFILE_DIR):
+    """Delete all but the newest `keep` profiles."""
+    stems = sorted(
+        (
+            entry[: -len(".json")]
+            for entry in os.listdir(directory)
+            if entry.endswith(".json")
+        ),
+        reverse=True,
+    )
+    for stem in stems[keep:]:
+        for suffix in (".json", ".wall.folded", ".cpu.folded"):
+            try:
+                os.remove(os.path.join(directory, stem + suffix))
+            except FileNotFoundError:
+                pass
+
+
+@contextmanager
+def _profile(name):
+    profiler = Profiler(name)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def maybe_profile(request, name):
+    return _profile(name) if authorized(request) else nullcontext()
+
+
+async def profile_events(events, name):
+    """Profile a streaming response for as long as its events are produced."""
+    with _profile(name):
+        async for event in events:
+            yield event
+
+
+def list_profiles(directory=PROFILE_DIR):
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for entry in sorted(os.listdir(directory), reverse=True):
+        if entry.endswith(".json"):
+            with open(os.path.join(directory, entry)) as f:
+                profiles.append(json.load(f))
+    return profiles
+
+
+def profile_path(file, directory=PROFILE_DIR):
+    # only hand out files the profiler wrote, never arbitrary paths
+    if file != os.path.basename(file) or not file.endswith(".folded"):
+        return None
+    path = os.path.join(directory, file)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+import metrics
+from utils import LLM_BACKEND_CONCURRENCY
+
+# model calls running at once, unset is as many as the backends accept
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 0))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 256))
+
+# lower runs first: style selection is short and unblocks post writing,
+# summaries are long
+PRIORITIES = {
+    "styles": 0,
+    "post": 1,
+    "posts_batched": 1,
+    "summarize": 2,
+    "condense": 2,
+}
+# below every stage: speculative calls only get slots nothing else wants
+BACKGROUND = 10
+
+QUEUE_WAIT = metrics.REGISTRY.histogram(
+    "llm_queue_wait_seconds", "Time model calls waited for a slot.", ("stage",)
+)
+REJECTIONS = metrics.REGISTRY.counter(
+    "llm_admission_rejections_total", "Generations rejected with a full queue."
+)
+
+_client = ContextVar("client", default="anonymous")
+_background = ContextVar("background", default=None)
+
+
+def set_client(client):
+    """Attribute the model calls made from the current context to `client`."""
+    _client.set(client)
+
+
+class Background:
+    """Speculative work whose model calls run at BACKGROUND priority until promoted."""
+
+    def __init__(self) -> None:
+        self.active = True
+
+    def promote(self):
+        """Somebody is waiting for the result now, schedule its calls normally."""
+        self.active = False
+
+
+def run_in_background():
+    """Run the model calls made from the current context in the background."""
+    background = Background()
+    _background.set(background)
+    return background
+
+
+@dataclass
+class _Waiter:
+    priority: int
+    client: str
+    seq: int
+    enqueued: float
+    future: asyncio.Future = field(repr=False)
+    background: Background = None
+
+    @property
+    def effective_priority(self):
+        if self.background is not None and self.background.active:
+            return BACKGROUND
+        return self.priority
+
+
+class Scheduler:
+    """Admission control and fair ordering for model calls.
+
+    At most `max_concurrency` calls run at once. Waiting calls are started by
+    priority (see PRIORITIES, background calls last), then in arrival order. Every call its client
+    already has running costs a call one level, so a client with a burst of
+    generations doesn't starve the others, and a call gains a level every
+    `aging` seconds so nothing waits forever. New generations are rejected up
+    front once `max_queue` calls are waiting.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=LLM_BACKEND_CONCURRENCY,
+        max_queue=LLM_MAX_QUEUE,
+        aging=10.0,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.aging = aging
+        self.running = 0
+        self._running_by_client = Counter()
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+
+    def _order(self, now):
+        def key(waiter: _Waiter):
+            aged = int((now - waiter.enqueued) // self.aging)
+            running = self._running_by_client[waiter.client]
+            return (waiter.effective_priority + running - aged, waiter.seq)
+
+        return key
+
+    def overloaded(self):
+        return len(self._queue) >= self.max_queue
+
+    def position(self, client):
+        """1-based place of the client's next queued call, 0 when none is waiting."""
+        ordered = sorted(self._queue, key=self._order(time.monotonic()))
+        for idx, waiter in enumerate(ordered):
+            if waiter.client == client:
+                return idx + 1
+        return 0
+
+    def _start(self, client):
+        self.running += 1
+        self._running_by_client[client] += 1
+
+    def _finish(self, client):
+        self.running -= 1
+        self._running_by_client[client] -= 1
+        if not self._running_by_client[client]:
+            del self._running_by_client[client]
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._queue and self.running < self.max_concurrency:
+            waiter = min(self._queue, key=self._order(time.monotonic()))
+            self._queue.remove(waiter)
+            if waiter.future.done():
+                continue
+            self._start(waiter.client)
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, stage="other"):
+        client = _client.get()
+        start = time.monotonic()
+        if self.running < self.max_concurrency and not self._queue:
+            self._start(client)
+        else:
+            waiter = _Waiter(
+                PRIORITIES.get(stage, 1),
+                client,
+                next(self._seq),
+                start,
+                asyncio.get_running_loop().create_future(),
+                _background.get(),
+            )
+            self._queue.append(waiter)
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+                elif waiter.future.done() and not waiter.future.cancelled():
+                    # the slot was handed over just as the caller went away
+                    self._finish(client)
+                raise
+        QUEUE_WAIT.observe(time.monotonic() - start, stage=stage)
+        try:
+            yield
+        finally:
+            self._finish(client)
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "queued": len(self._queue),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "clients": len(self._running_by_client),
+        }
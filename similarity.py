@@ -0,0 +1,167 @@
+import itertools
+import re
+import zlib
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+WORDS = re.compile(r"\w+")
+
+
+def shingles(text, k=3):
+    words = WORDS.findall(text.lower())
+    if len(words) < k:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + k]) for i in range(len(words) - k + 1)}
+
+
+def jaccard(a: set, b: set):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures of shingle sets, one permutation at a time over all sets.
+
+    Shingles are hashed with crc32 so signatures are stable across processes,
+    then permuted with multiply-shift hashing.
+    """
+
+    def __init__(self, num_perm=64, seed=1) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # 64 bit odd multipliers, the products must wrap for multiply-shift
+        self.a = rng.integers(1, 2**64, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**64, num_perm, dtype=np.uint64)
+
+    def signatures(self, shingle_sets) -> np.ndarray:
+        """(len(shingle_sets), num_perm) uint32, all-ones rows for empty sets."""
+        hashes = [
+            [zlib.crc32(" ".join(s).encode()) for s in shingled]
+            for shingled in shingle_sets
+        ]
+        lengths = np.array([len(h) for h in hashes], dtype=np.int64)
+        signatures = np.full((len(hashes), self.num_perm), 0xFFFFFFFF, dtype=np.uint32)
+        nonempty = lengths > 0
+        if not nonempty.any():
+            return signatures
+        flat = np.fromiter(
+            itertools.chain.from_iterable(hashes), dtype=np.uint64, count=lengths.sum()
+        )
+        starts = (np.cumsum(lengths) - lengths)[nonempty]
+        for perm in range(self.num_perm):
+            permuted = ((flat * self.a[perm] + self.b[perm]) >> np.uint64(32)).astype(
+                np.uint32
+            )
+            signatures[nonempty, perm] = np.minimum.reduceat(permuted, starts)
+        return signatures
+
+
+def article_text(article):
+    return " ".join(
+        article.get(field) or "" for field in ("title", "description", "snippet")
+    )
+
+
+class StoryClusters:
+    """Incremental near-duplicate clustering of articles by MinHash LSH.
+
+    Articles whose title, description and snippet shingles have an estimated
+    Jaccard similarity of at least `threshold` with an article already seen
+    join its cluster; clusters are named after their first article and an
+    article never changes cluster. Candidates come from `bands` LSH bands, so
+    adding articles costs the same whatever the number already clustered.
+    The oldest of more than `max_entries` articles are forgotten.
+    """
+
+    def __init__(
+        self, threshold=0.5, num_perm=64, bands=16, k=3, max_entries=50_000
+    ) -> None:
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.k = k
+        self.max_entries = max_entries
+        self.hasher = MinHasher(num_perm)
+        # uuid -> (cluster, signature), oldest first
+        self._articles: OrderedDict[str, tuple[str, np.ndarray]] = OrderedDict()
+        self._buckets: dict[tuple[int, bytes], list[str]] = defaultdict(list)
+        self._members: dict[str, set[str]] = defaultdict(set)
+
+    def _band_keys(self, signature: np.ndarray):
+        return [
+            (band, signature[band * self.rows : (band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def _assign(self, uuid, signature: np.ndarray, empty):
+        cluster = uuid
+        if not empty:
+            candidates = {
+                other
+                for key in self._band_keys(signature)
+                for other in self._buckets.get(key, ())
+            }
+            if candidates:
+                candidates = list(candidates)
+                others = np.stack([self._articles[other][1] for other in candidates])
+                similarity = (others == signature).mean(axis=1)
+                best = int(similarity.argmax())
+                if similarity[best] >= self.threshold:
+                    cluster = self._articles[candidates[best]][0]
+            for key in self._band_keys(signature):
+                self._buckets[key].append(uuid)
+        self._articles[uuid] = (cluster, signature)
+        self._members[cluster].add(uuid)
+        return cluster
+
+    def _forget(self):
+        while len(self._articles) > self.max_entries:
+            uuid, (cluster, signature) = self._articles.popitem(last=False)
+            for key in self._band_keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is not None and uuid in bucket:
+                    bucket.remove(uuid)
+                    if not bucket:
+                        del self._buckets[key]
+            members = self._members[cluster]
+            members.discard(uuid)
+            if not members:
+                del self._members[cluster]
+
+    def add(self, articles: list[dict]):
+        """Cluster the articles not seen yet; returns the cluster of every article."""
+        new = [
+            article
+            for article in {a["uuid"]: a for a in articles}.values()
+            if article["uuid"] not in self._articles
+        ]
+        if new:
+            shingled = [shingles(article_text(article), self.k) for article in new]
+            signatures = self.hasher.signatures(shingled)
+            for article, shingle_set, signature in zip(new, shingled, signatures):
+                self._assign(article["uuid"], signature, not shingle_set)
+            self._forget()
+        return [self.cluster(article["uuid"]) for article in articles]
+
+    def cluster(self, uuid):
+        entry = self._articles.get(uuid)
+        return uuid if entry is None else entry[0]
+
+    def members(self, uuid):
+        """Every remembered article in the same cluster as `uuid`."""
+        return set(self._members.get(self.cluster(uuid), ())) | {uuid}
+
+    def groups(self, articles: list[dict]):
+        """Indices of `articles` grouped by cluster, in order of first appearance."""
+        groups: dict[str, list[int]] = {}
+        for idx, cluster in enumerate(self.add(articles)):
+            groups.setdefault(cluster, []).append(idx)
+        return [
+            {"cluster": cluster, "articles": indices}
+            for cluster, indices in groups.items()
+        ]
+
+    def stats(self):
+        return {"articles": len(self._articles), "clusters": len(self._members)}
@@ -0,0 +1,52 @@
+import asyncio
+from collections import Counter
+from collections.abc import Hashable
+
+from streaming_json import ItemFeed
+
+
+class SingleFlight:
+    """Coalesce concurrent calls sharing a key into one in-flight task."""
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self._feeds: dict[Hashable, ItemFeed] = {}
+        self._waiting = Counter()
+
+    async def do(self, key: Hashable, fn, *args):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # one caller going away must not cancel the work the others wait on
+        self._waiting[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+
+    def abandon(self, key: Hashable):
+        """Cancel the call for `key` if no caller is waiting on it any more.
+
+        Returns the cancelled task, if any.
+        """
+        task = self._calls.get(key)
+        if task is None or self._waiting[key]:
+            return None
+        task.cancel()
+        return task
+
+    def feed(self, key: Hashable, fn, *args) -> ItemFeed:
+        """Like `do` for async generators: callers share one ItemFeed of its items."""
+        feed = self._feeds.get(key)
+        if feed is None:
+            feed = ItemFeed(fn(*args))
+            self._feeds[key] = feed
+            feed.task.add_done_callback(lambda _: self._feeds.pop(key, None))
+        return feed
+
+    def in_flight(self, key: Hashable):
+        return key in self._calls or key in self._feeds
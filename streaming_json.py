@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+from json_repair import repair_json
+
+
+def _objects(value):
+    # a repair can split what looked like one object into several
+    values = value if isinstance(value, list) else [value]
+    return [value for value in values if isinstance(value, dict) and value]
+
+
+def _load(text):
+    try:
+        return _objects(json.loads(text))
+    except json.JSONDecodeError:
+        repaired = repair_json(text, return_objects=True)
+        print("repaired streamed object", repaired)
+        return _objects(repaired)
+
+
+class ItemParser:
+    """Incrementally picks the objects of a streamed JSON list.
+
+    Feed completion text as it arrives. Every object directly inside the first
+    list, `{"styles": [{...}, {...}]}` or a bare `[{...}, {...}]`, is returned
+    by `feed` as soon as its closing brace arrives. Objects are decoded one by
+    one, so a broken object is repaired on its own and cannot take its
+    neighbours down with it.
+    """
+
+    def __init__(self) -> None:
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._list_depth = None
+        self._finished = False
+        self._item = None
+
+    def feed(self, text):
+        items = []
+        for char in text:
+            if self._item is not None:
+                self._item.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                depth = len(self._stack)
+                self._stack.append(char)
+                if self._finished:
+                    continue
+                if char == "[" and self._list_depth is None and depth <= 1:
+                    self._list_depth = depth
+                elif (
+                    char == "{"
+                    and self._item is None
+                    and self._list_depth is not None
+                    and depth == self._list_depth + 1
+                ):
+                    self._item = [char]
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._finished or self._list_depth is None:
+                    continue
+                depth = len(self._stack)
+                if self._item is not None and depth == self._list_depth + 1:
+                    items += _load("".join(self._item))
+                    self._item = None
+                elif depth == self._list_depth:
+                    self._finished = True
+        return items
+
+    def close(self):
+        """Repair the object the stream stopped in the middle of, if any."""
+        if self._item is None:
+            return []
+        repaired = repair_json("".join(self._item), return_objects=True)
+        self._item = None
+        print("repaired truncated object", repaired)
+        return _objects(repaired)
+
+
+class ItemFeed:
+    """Items of a streamed list that consumers can read while it is filling.
+
+    The source is consumed by its own task, so every reader sees the same
+    items and a reader going away doesn't stop the stream for the others.
+    """
+
+    def __init__(self, items=None) -> None:
+        self.items = []
+        self.error = None
+        self._changed = asyncio.Event()
+        self.done = items is None
+        self.task = None if items is None else asyncio.ensure_future(self._fill(items))
+
+    @classmethod
+    def of(cls, items):
+        feed = cls()
+        feed.items = list(items)
+        return feed
+
+    async def _fill(self, items):
+        try:
+            async for item in items:
+                self.items.append(item)
+                self._notify()
+        except Exception as e:
+            print("item stream failed", e)
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _wait(self, count):
+        while len(self.items) < count and not self.done:
+            await self._changed.wait()
+        if not self.items and self.error is not None:
+            raise self.error
+
+    async def get(self, idx):
+        """The item at `idx`, or None when the stream ended with fewer items."""
+        await self._wait(idx + 1)
+        return self.items[idx] if idx < len(self.items) else None
+
+    async def all(self):
+        await self._wait(float("inf"))
+        return list(self.items)
@@ -75,3 +75,19 @@ def chain_of_density(article):
         "summaries": ["Missing_Entities": [], "Denser_Summary": ""]
     }
     """
+
+
+@prompt
+def chunk_summary(article, chunk, part, parts):
+    """Article:
+        TITLE: {{ article.title }}
+        DESCRIPTION: {{ article.description }}
+        PART {{ part }} OF {{ parts }}: {{ chunk }}
+
+    Summarize PART {{ part }} of the above Article in at most 150 words.
+    Keep every name, number, date, place and quote that matters to the main story.
+    Do not add anything that is not in this part.
+
+    # OUTPUT #
+    Answer only with the summary text.
+    """
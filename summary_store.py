@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+def template_hash(prompt):
+    return hashlib.sha256(prompt.template.encode()).hexdigest()[:16]
+
+
+class SummaryStore:
+    """Summarized articles keyed by article uuid, model name and prompt template.
+
+    Bounded by entry count (LRU) and age; optionally persisted to a json file
+    so a restart does not throw away the most expensive stage.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 12 * 3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def key(self, uuid, model, prompt):
+        return f"{uuid}:{model}:{template_hash(prompt)}"
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[0] > self.ttl:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return dict(entry[1])
+
+    def __contains__(self, key):
+        # a lookup that doesn't count towards the hit rate
+        entry = self._entries.get(key)
+        return entry is not None and time.time() - entry[0] <= self.ttl
+
+    def set(self, key, article: dict):
+        self._entries[key] = (time.time(), dict(article))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            entries = json.load(f)
+        now = time.time()
+        for key, stored_at, article in entries:
+            if now - stored_at <= self.ttl:
+                self._entries[key] = (stored_at, article)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        """Write the store, merged with what other processes saved meanwhile."""
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        merged = {}
+        try:
+            with open(self.path) as f:
+                for key, stored_at, article in json.load(f):
+                    merged[key] = (stored_at, article)
+        except (OSError, ValueError):
+            pass
+        for key, (stored_at, article) in self._entries.items():
+            if key not in merged or merged[key][0] <= stored_at:
+                merged[key] = (stored_at, article)
+        now = time.time()
+        entries = sorted(
+            (
+                [key, at, article]
+                for key, (at, article) in merged.items()
+                if now - at <= self.ttl
+            ),
+            key=lambda entry: entry[1],
+        )[-self.max_entries :]
+        # per process, so a batch run and the web app don't share a temp file
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
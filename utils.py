@@ -1,7 +1,12 @@
+import gzip
+import hashlib
+import json
+import os
 import re
 from collections.abc import AsyncIterable, Iterable
 from enum import Enum
 
+import metrics
 from json_repair import repair_json
 from openai import AsyncOpenAI
 from outlines.models import openai
@@ -9,8 +14,8 @@ from outlines.models.openai import OpenAIConfig
 from pydantic import BaseModel, model_validator
 from starlette.background import BackgroundTask
 from starlette.concurrency import iterate_in_threadpool
-from starlette.responses import JSONResponse, StreamingResponse
-from typing_extensions import Any, Union, get_args, get_origin
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from typing_extensions import Any, ClassVar, Union, get_args, get_origin
 
 
 class Choices(str, Enum):
@@ -38,21 +43,30 @@ def is_enum(enum_type):
 
 
 class Option(BaseModel):
-    @model_validator(mode="before")
+    # field name -> (expect_list, enum_type, enum names and values -> member),
+    # built once per subclass
+    _enum_fields: ClassVar[dict[str, tuple[bool, type[Enum], dict]]] = {}
+
     @classmethod
-    def convert_to_enum(cls, values: Any) -> Any:
-        enummed = {}
-        print(cls)
-        print(values)
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        enum_fields = {}
         for field_name, field_info in cls.model_fields.items():
             expect_list, enum_type = is_enum(field_info.annotation)
             if enum_type is None:
                 continue
-            # print('enum recognized', enum_type)
-            if isinstance(values, dict):
-                value = values.pop(field_name, None)
-            else:
-                value = values
+            # names take precedence over values, like enum_type[val] before enum_type(val)
+            lookup = {**enum_type._value2member_map_, **enum_type.__members__}
+            enum_fields[field_name] = (expect_list, enum_type, lookup)
+        cls._enum_fields = enum_fields
+
+    @model_validator(mode="before")
+    @classmethod
+    def convert_to_enum(cls, values: Any) -> Any:
+        enummed = {}
+        is_dict = isinstance(values, dict)
+        for field_name, (expect_list, enum_type, lookup) in cls._enum_fields.items():
+            value = values.pop(field_name, None) if is_dict else values
             if value is None:
                 continue
 
@@ -64,35 +78,28 @@ class Option(BaseModel):
                 for val in value:
                     if isinstance(val, Enum):
                         enummed[field_name].append(val)
-                    else:
-                        try:
-                            enummed[field_name].append(enum_type[val])
-                        except KeyError:
-                            try:
-                                enummed[field_name].append(enum_type(val))
-                            except ValueError as e:
-                                print(e)
+                        continue
+                    member = lookup.get(val)
+                    if member is None:
+                        print(f"{val!r} is not a valid {enum_type.__qualname__}")
+                        continue
+                    enummed[field_name].append(member)
 
             if isinstance(value, str):
-                try:
-                    enummed[field_name] = enum_type[value]
-                except KeyError:
-                    try:
-                        enummed[field_name] = enum_type(value)
-                    except ValueError as e:
-                        print(e)
-
-        if isinstance(values, dict):
+                member = lookup.get(value)
+                if member is None:
+                    print(f"{value!r} is not a valid {enum_type.__qualname__}")
+                else:
+                    enummed[field_name] = member
+
+        if is_dict:
             return {**enummed, **values}
         return enummed
 
     @classmethod
     def get_options(cls, allowed_choices: dict[str, list[str]] = {}):
         options = {}
-        for key, field_info in cls.model_fields.items():
-            _, enum_type = is_enum(field_info.annotation)
-            if enum_type is None:
-                continue
+        for key, (_, enum_type, _) in cls._enum_fields.items():
             choices = []
             if key in allowed_choices:
                 for choice in allowed_choices[key]:
@@ -112,10 +119,7 @@ class Option(BaseModel):
 
     def get_enum_names(self):
         json_options = {}
-        for key, field in self.model_fields.items():
-            expect_list, enum_type = is_enum(field.annotation)
-            if enum_type is None:
-                continue
+        for key, (expect_list, _, _) in self._enum_fields.items():
             value = getattr(self, key)
             if value is None:
                 continue
@@ -127,10 +131,7 @@ class Option(BaseModel):
 
     def get_enums(self):
         json_options = {}
-        for key, field in self.model_fields.items():
-            expect_list, enum_type = is_enum(field.annotation)
-            if enum_type is None:
-                continue
+        for key, (expect_list, _, _) in self._enum_fields.items():
             value = getattr(self, key)
             if value is None:
                 continue
@@ -141,17 +142,43 @@ class Option(BaseModel):
         return json_options
 
 
-def get_model(temperature=0.75):
-    client = AsyncOpenAI(
-        base_url="http://localhost:1234/v1", api_key="lm-studio", max_retries=4
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:1234/v1")
+MODEL_NAME = "TheBloke/Mistral-7B-Instruct-v0.1-GGUF"
+MODEL_CONTEXT = int(os.getenv("MODEL_CONTEXT", 8192))
+# tokens left for a completion, prompts must fit in the rest of the context
+COMPLETION_TOKENS = 1536
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "")
+LLM_BACKEND_CONCURRENCY = int(os.getenv("LLM_BACKEND_CONCURRENCY", 16))
+
+
+def get_client(base_url=None, max_retries=4):
+    return AsyncOpenAI(
+        base_url=base_url or LLM_BASE_URL, api_key="lm-studio", max_retries=max_retries
     )
+
+
+def get_backends(spec=None):
+    """(base url, max concurrent requests) for each LLM backend.
+
+    `spec` (default LLM_BACKENDS, then LLM_BASE_URL) is a comma separated list
+    of base urls, each optionally followed by `#<max concurrent requests>`.
+    """
+    backends = []
+    for entry in (spec or LLM_BACKENDS or LLM_BASE_URL).split(","):
+        url, _, limit = entry.strip().partition("#")
+        if url:
+            backends.append((url, int(limit) if limit else LLM_BACKEND_CONCURRENCY))
+    return backends
+
+
+def get_model(temperature=0.75, client=None, **config):
     config = OpenAIConfig(
-        "TheBloke/Mistral-7B-Instruct-v0.1-GGUF",
-        max_tokens=30000,
+        MODEL_NAME,
         temperature=temperature,
         user="Mario",
+        **{"max_tokens": COMPLETION_TOKENS, **config},
     )
-    return openai(client, config)
+    return openai(client or get_client(), config)
 
 
 def find_key_in_nested_dict(d, target_key):
@@ -178,6 +205,7 @@ def return_modeled(cls_model: BaseModel, broken_json):
         return re.sub(r"```json(.*)```", r"\g<1>", re.sub(r"(\\n|\\)", "", broken_json))
 
     print(f"repairing model {cls_model} ...")
+    metrics.JSON_REPAIRS.inc(schema=cls_model.__name__)
     if isinstance(broken_json, list):
         ext_json = "{" + ",".join([inp["input"] for inp in broken_json]) + "}"
         rep_json = repair_json(regex_clean_json(ext_json), return_objects=True)
@@ -217,3 +245,43 @@ class JSONStreamingResponse(StreamingResponse, JSONResponse):
             self.media_type = media_type
         self.background = background
         self.init_headers(headers)
+
+
+class PrecomputedJSON:
+    """A JSON payload serialized and gzipped once, served with a strong ETag."""
+
+    def __init__(self, content: Any, max_age: int = 86400) -> None:
+        self.body = json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()[:16]
+        # the gzipped bytes differ, so they get their own strong validator
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+        self.cache_control = f"public, max-age={max_age}"
+
+    def _headers(self, etag):
+        return {
+            "ETag": etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+    def response(self, request) -> Response:
+        gzipped = "gzip" in request.headers.get("accept-encoding", "")
+        etag = self.gzip_etag if gzipped else self.etag
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or tags & {self.etag, self.gzip_etag}:
+                return Response(status_code=304, headers=self._headers(etag))
+        if gzipped:
+            return Response(
+                self.gzipped,
+                media_type="application/json",
+                headers={**self._headers(etag), "Content-Encoding": "gzip"},
+            )
+        return Response(
+            self.body, media_type="application/json", headers=self._headers(etag)
+        )